@@ -22,10 +22,16 @@ Outputs: egraph.json
 
 from __future__ import annotations
 from collections.abc import Iterable
+import functools
 from egglog import *
 from egglog.egraph import to_runtime_expr
 import json
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 
 class MemRegion(Expr):
     @classmethod
@@ -94,33 +100,38 @@ class Tile(Expr):
     @property
     def loop_iters(self) -> i64: ...
 
+    # Bytes WGMMA implicitly loads to registers when this tile is an operand
+    @property
+    def smem_read_bytes(self) -> i64: ...
 
 
-def build_egraph(tiles, accum_dtype_bytes=4):
-    """Build the attention egraph, run rewrites, return (egraph, result, A).
 
-    tiles: dictionary of tile name -> (rows, cols, dtype_bytes, loop_iters)
-    This is how the tiles will later be built:
-    q_r, q_c, q_d, q_li = tiles["Q"]
-    k_r, k_c, k_d, k_li = tiles["K"]
-    v_r, v_c, v_d, v_li = tiles["V"]
+def _copy_shape(t, r, c, d, al):
+    """Actions giving t the shape and trip count (rows, cols, dtype_bytes,
+    loop_iters) bound from its source tile in a rule query."""
+    return (
+        set_(t.rows).to(r),
+        set_(t.cols).to(c),
+        set_(t.dtype_bytes).to(d),
+        set_(t.loop_iters).to(al),
+    )
 
-    Q_input = Tile.input("Q", q_r, q_c, q_d)
-    K_input = Tile.input("K", k_r, k_c, k_d)
-    V_input = Tile.input("V", v_r, v_c, v_d)
+
+@functools.lru_cache(maxsize=8)
+def attention_rules(accum_dtype_bytes=4):
+    """Analysis and rewrite ruleset for Tile, built once per accumulator dtype.
+
+    The ruleset does not depend on the tile shapes, so sweeps over tiles
+    reuse the same object across fresh EGraphs.
 
     accum_dtype_bytes: dtype size for WGMMA output (4 = fp32)
     """
-    egraph = EGraph()
-
     # Capture accum_dtype_bytes for use inside rules
     _accum_db = accum_dtype_bytes
 
-    @egraph.register
-    def _(t: Tile, a: Tile, b: Tile, s: String,
+    def rules(t: Tile, a: Tile, b: Tile, s: String,
           r: i64, c: i64, d: i64,
-          ar: i64, ac: i64, ad: i64,
-          br: i64, bc: i64, bd: i64,
+          sa: i64, sb: i64,
           al: i64, bl: i64,
           mr: MemRegion) -> Iterable[RewriteOrRule]:
 
@@ -129,7 +140,7 @@ def build_egraph(tiles, accum_dtype_bytes=4):
             set_(t.rows).to(r),
             set_(t.cols).to(c),
             set_(t.dtype_bytes).to(d),
-            set_(t.mem_region).to(MemRegion.GLOBAL()),
+            union(t.mem_region).with_(MemRegion.GLOBAL()),
         )
 
         # LDS: global -> shared, transaction = tile bytes * loop_iters
@@ -137,11 +148,8 @@ def build_egraph(tiles, accum_dtype_bytes=4):
             t == Tile.LDS(a),
             r == a.rows, c == a.cols, d == a.dtype_bytes, al == a.loop_iters,
         ).then(
-            set_(t.rows).to(r),
-            set_(t.cols).to(c),
-            set_(t.dtype_bytes).to(d),
-            set_(t.mem_region).to(MemRegion.SHARED()),
-            set_(t.loop_iters).to(al),
+            *_copy_shape(t, r, c, d, al),
+            union(t.mem_region).with_(MemRegion.SHARED()),
             set_cost(Tile.LDS(a), r * c * d * al),
         )
 
@@ -150,63 +158,39 @@ def build_egraph(tiles, accum_dtype_bytes=4):
             t == Tile.LDR(a),
             r == a.rows, c == a.cols, d == a.dtype_bytes, al == a.loop_iters,
         ).then(
-            set_(t.rows).to(r),
-            set_(t.cols).to(c),
-            set_(t.dtype_bytes).to(d),
-            set_(t.mem_region).to(MemRegion.REGISTERS()),
-            set_(t.loop_iters).to(al),
+            *_copy_shape(t, r, c, d, al),
+            union(t.mem_region).with_(MemRegion.REGISTERS()),
             set_cost(Tile.LDR(a), r * c * d * al),
         )
 
-        # WGMMA: transaction = implicit smem->reg load for shared operands.
-        # Operands already in registers cost 0 (no additional traffic).
-        # Output is rows(a) x cols(b), accum dtype, in registers.
-
-        # Both operands in shared: implicit load of both
+        # Bytes a WGMMA operand costs to read, given where the tile lives:
+        # the whole tile if it is in SHARED (implicit smem->reg load),
+        # nothing if it is already in REGISTERS.
         yield rule(
-            t == Tile.WGMMA(a, b), r == a.rows, c == b.cols,
-            ar == a.rows, ac == a.cols, ad == a.dtype_bytes, al == a.loop_iters,
-            br == b.rows, bc == b.cols, bd == b.dtype_bytes, bl == b.loop_iters,
-            eq(a.mem_region).to(MemRegion.SHARED()),
-            eq(b.mem_region).to(MemRegion.SHARED()),
+            eq(t.mem_region).to(MemRegion.SHARED()),
+            r == t.rows, c == t.cols, d == t.dtype_bytes,
         ).then(
-            set_(t.rows).to(r),
-            set_(t.cols).to(c),
-            set_(t.dtype_bytes).to(i64(_accum_db)),
-            set_(t.mem_region).to(MemRegion.REGISTERS()),
-            set_(t.loop_iters).to(al.max(bl)),
-            set_cost(Tile.WGMMA(a, b), (ar * ac * ad + br * bc * bd) * al.max(bl)),
+            set_(t.smem_read_bytes).to(r * c * d),
         )
-
-        # a in registers, b in shared: implicit load of b only
         yield rule(
-            t == Tile.WGMMA(a, b), r == a.rows, c == b.cols,
-            al == a.loop_iters,
-            br == b.rows, bc == b.cols, bd == b.dtype_bytes, bl == b.loop_iters,
-            eq(a.mem_region).to(MemRegion.REGISTERS()),
-            eq(b.mem_region).to(MemRegion.SHARED()),
+            eq(t.mem_region).to(MemRegion.REGISTERS()),
         ).then(
-            set_(t.rows).to(r),
-            set_(t.cols).to(c),
-            set_(t.dtype_bytes).to(i64(_accum_db)),
-            set_(t.mem_region).to(MemRegion.REGISTERS()),
-            set_(t.loop_iters).to(al.max(bl)),
-            set_cost(Tile.WGMMA(a, b), br * bc * bd * al.max(bl)),
+            set_(t.smem_read_bytes).to(i64(0)),
         )
 
-        # Both in registers: no data movement
+        # WGMMA: transaction = implicit smem->reg load for shared operands.
+        # Output is rows(a) x cols(b), accum dtype, in registers.
         yield rule(
             t == Tile.WGMMA(a, b), r == a.rows, c == b.cols,
             al == a.loop_iters, bl == b.loop_iters,
-            eq(a.mem_region).to(MemRegion.REGISTERS()),
-            eq(b.mem_region).to(MemRegion.REGISTERS()),
+            sa == a.smem_read_bytes, sb == b.smem_read_bytes,
         ).then(
             set_(t.rows).to(r),
             set_(t.cols).to(c),
             set_(t.dtype_bytes).to(i64(_accum_db)),
-            set_(t.mem_region).to(MemRegion.REGISTERS()),
+            union(t.mem_region).with_(MemRegion.REGISTERS()),
             set_(t.loop_iters).to(al.max(bl)),
-            set_cost(Tile.WGMMA(a, b), i64(0)),
+            set_cost(Tile.WGMMA(a, b), (sa + sb) * al.max(bl)),
         )
 
         # Elementwise: pure compute, 0 transaction cost
@@ -215,11 +199,8 @@ def build_egraph(tiles, accum_dtype_bytes=4):
             r == a.rows, c == a.cols, d == a.dtype_bytes,
             mr == a.mem_region, al == a.loop_iters,
         ).then(
-            set_(t.rows).to(r),
-            set_(t.cols).to(c),
-            set_(t.dtype_bytes).to(d),
-            set_(t.mem_region).to(mr),
-            set_(t.loop_iters).to(al),
+            *_copy_shape(t, r, c, d, al),
+            union(t.mem_region).with_(mr),
             set_cost(Tile.Elementwise(a), i64(0)),
         )
 
@@ -228,11 +209,8 @@ def build_egraph(tiles, accum_dtype_bytes=4):
             t == Tile.STS(a),
             r == a.rows, c == a.cols, d == a.dtype_bytes, al == a.loop_iters,
         ).then(
-            set_(t.rows).to(r),
-            set_(t.cols).to(c),
-            set_(t.dtype_bytes).to(d),
-            set_(t.mem_region).to(MemRegion.SHARED()),
-            set_(t.loop_iters).to(al),
+            *_copy_shape(t, r, c, d, al),
+            union(t.mem_region).with_(MemRegion.SHARED()),
             set_cost(Tile.STS(a), r * c * d * al),
         )
 
@@ -241,11 +219,8 @@ def build_egraph(tiles, accum_dtype_bytes=4):
             t == Tile.STG(a),
             r == a.rows, c == a.cols, d == a.dtype_bytes, al == a.loop_iters,
         ).then(
-            set_(t.rows).to(r),
-            set_(t.cols).to(c),
-            set_(t.dtype_bytes).to(d),
-            set_(t.mem_region).to(MemRegion.GLOBAL()),
-            set_(t.loop_iters).to(al),
+            *_copy_shape(t, r, c, d, al),
+            union(t.mem_region).with_(MemRegion.GLOBAL()),
             set_cost(Tile.STG(a), r * c * d * al),
         )
 
@@ -279,6 +254,26 @@ def build_egraph(tiles, accum_dtype_bytes=4):
             union(t).with_(Tile.WGMMA(Tile.LDR(a), b))
         )
 
+    return ruleset(rules, name=f"attention_rules_{accum_dtype_bytes}")
+
+
+def build_egraph(tiles, accum_dtype_bytes=4):
+    """Build the attention egraph, run rewrites, return (egraph, result, A).
+
+    tiles: dictionary of tile name -> (rows, cols, dtype_bytes, loop_iters)
+    This is how the tiles will later be built:
+    q_r, q_c, q_d, q_li = tiles["Q"]
+    k_r, k_c, k_d, k_li = tiles["K"]
+    v_r, v_c, v_d, v_li = tiles["V"]
+
+    Q_input = Tile.input("Q", q_r, q_c, q_d)
+    K_input = Tile.input("K", k_r, k_c, k_d)
+    V_input = Tile.input("V", v_r, v_c, v_d)
+
+    accum_dtype_bytes: dtype size for WGMMA output (4 = fp32)
+    """
+    egraph = EGraph()
+
     # Build tile inputs from the tiles dict
     q_r, q_c, q_d, q_li = tiles["Q"]
     k_r, k_c, k_d, k_li = tiles["K"]
@@ -304,11 +299,16 @@ def build_egraph(tiles, accum_dtype_bytes=4):
 
     result = egraph.let("attention_output", Tile.STG(Tile.STS(output)))
 
-    egraph.run(10)
+    # Stop as soon as an iteration adds nothing new (saturated)
+    rules = attention_rules(accum_dtype_bytes)
+    for _ in range(10):
+        if not egraph.run(1, ruleset=rules).updated:
+            break
     return egraph, result, A
 
 
-def serialize_egraph(egraph, root_exprs=None):
+def serialize_egraph_str(egraph, root_exprs=None):
+    """Serialize the egraph to egglog's JSON string, without parsing it."""
     roots = []
     if root_exprs:
         for e in root_exprs:
@@ -323,11 +323,24 @@ def serialize_egraph(egraph, root_exprs=None):
     )
     serialized.split_classes(egraph._egraph, set())
     serialized.map_ops(egraph._state.op_mapping())
-    return json.loads(serialized.to_json())
+    return serialized.to_json()
+
+
+def _loads(text):
+    return orjson.loads(text) if orjson else json.loads(text)
+
+
+def serialize_egraph_obj(egraph, root_exprs=None):
+    """Serialize the egraph to a dict, for in-process consumers."""
+    return _loads(serialize_egraph_str(egraph, root_exprs))
 
 
 def build_and_serialize(output_path="output/egraph.json", tiles=None, accum_dtype_bytes=4):
-    """Build egraph, print tree extraction, serialize to JSON."""
+    """Build egraph, print tree extraction, serialize to JSON.
+
+    Returns the serialized egraph dict, so in-process callers need not
+    read output_path back.
+    """
     if tiles is None:
         tiles = {"Q": (128, 64, 2, 1), "K": (64, 128, 2, 8), "V": (128, 64, 2, 8)}
     egraph, result, A = build_egraph(tiles=tiles, accum_dtype_bytes=accum_dtype_bytes)
@@ -344,12 +357,13 @@ def build_and_serialize(output_path="output/egraph.json", tiles=None, accum_dtyp
         print(f"  {i+1}. {v}")
     print()
 
-    graph_json = serialize_egraph(egraph, root_exprs=[result])
+    # egglog already emits JSON; write it as-is rather than parse and re-dump
+    text = serialize_egraph_str(egraph, root_exprs=[result])
     with open(output_path, "w") as f:
-        json.dump(graph_json, f, indent=2)
+        f.write(text)
     print(f"Wrote {output_path}")
 
-    return output_path
+    return _loads(text)
 
 # For running as standalone file
 if __name__ == "__main__":
@@ -3,18 +3,93 @@ ILP-based optimal DAG extraction from a serialized egraph JSON.
 
 Reads an egraph JSON file, computes traffic costs from the analysis
 nodes embedded in the graph, and solves for the minimum-cost DAG
-using integer linear programming (PuLP/CBC).
+using integer linear programming (highspy, python-mip, or PuLP with
+HiGHS/CBC).
 
 Input:  egraph.json (from attention.py)
 Output: prints the optimal extraction and its cost
 """
 
+import functools
 import json
+import math
 import sys
+from array import array
+from dataclasses import dataclass
+from enum import IntEnum
 import pulp
 
+try:
+    import highspy
+except ImportError:
+    highspy = None
+
+try:
+    import mip
+except ImportError:
+    mip = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class OpID(IntEnum):
+    """Integer id for each op compute_traffic_costs dispatches on."""
+    OTHER = 0
+    LDS = 1
+    LDR = 2
+    STS = 3
+    STG = 4
+    WGMMA = 5
+    ROWS = 6
+    COLS = 7
+    DTYPE_BYTES = 8
+    LOOP_ITERS = 9
+    MEM_REGION = 10
+    SHARED = 11
+
+
+# Serialized op string -> OpID; anything not listed is OpID.OTHER
+OP_IDS = {
+    "Tile.LDS": OpID.LDS,
+    "Tile.LDR": OpID.LDR,
+    "Tile.STS": OpID.STS,
+    "Tile.STG": OpID.STG,
+    "Tile.WGMMA": OpID.WGMMA,
+    "\u00b7.rows": OpID.ROWS,
+    "\u00b7.cols": OpID.COLS,
+    "\u00b7.dtype_bytes": OpID.DTYPE_BYTES,
+    "\u00b7.loop_iters": OpID.LOOP_ITERS,
+    "\u00b7.mem_region": OpID.MEM_REGION,
+    "MemRegion.SHARED": OpID.SHARED,
+}
+
+
+def load_graph_json(json_path):
+    """Read a serialized egraph JSON file (orjson when installed, else json)."""
+    with open(json_path, "rb") as f:
+        data = f.read()
+    return orjson.loads(data) if orjson else json.loads(data)
+
+
+@functools.lru_cache(maxsize=None)
+def default_solver():
+    """Pick the fastest PuLP solver binary available on this machine.
+
+    Only used when highspy is not installed or a PuLP solver is requested.
+    Prefers the highs binary and falls back to the CBC binary bundled with
+    PuLP. Any other PuLP solver can be passed explicitly via solver=,
+    e.g. pulp.GUROBI(msg=0, warmStart=True).
+    """
+    solver = pulp.HiGHS_CMD(msg=False)
+    if solver.available():
+        return solver
+    return pulp.PULP_CBC_CMD(msg=0)
+
 
-def ilp_extract(graph_json, node_costs=None):
+def ilp_extract(graph_json, node_costs=None, solver=None, relax_first=False):
     """Optimal DAG extraction via ILP.
 
     Binary variable x_n for each e-node: 1 if selected.
@@ -25,71 +100,174 @@ def ilp_extract(graph_json, node_costs=None):
       1. Root e-classes must be active: y_root = 1
       2. Exactly one e-node per active e-class: sum(x_n) = y_c
       3. If e-node selected, children e-classes active: y_child >= x_n
+
+    graph_json: serialized egraph dict, or a prebuilt GraphSoA (intern_graph).
+    solver: PuLP solver instance. When omitted the model is passed straight
+            to highspy if installed, otherwise solved via default_solver().
+    relax_first: solve the LP relaxation first and return it when it is
+            already integral. Helps only where the relaxation is tight; on
+            the attention graphs it is fractional, so it is off by default.
     """
-    nodes = graph_json["nodes"]
-    root_eclasses = graph_json["root_eclasses"]
+    graph = _ilp_graph(_as_graph(graph_json), node_costs)
+    return _ilp_solve(graph, node_costs, solver=solver, relax_first=relax_first)
 
-    eclass_to_nodes = {}
-    for nid, ndata in nodes.items():
-        ec = ndata["eclass"]
-        eclass_to_nodes.setdefault(ec, []).append(nid)
 
-    def children_eclasses(nid):
-        return [nodes[child]["eclass"] for child in nodes[nid]["children"]]
+def dag_extract(graph_json, node_costs=None, solver=None):
+    """Exact extraction by dynamic programming over the e-class DAG.
 
-    def cost(nid):
-        if node_costs and nid in node_costs:
-            return node_costs[nid]
-        return nodes[nid]["cost"]
+    Visits e-classes children-first (Kahn's algorithm on the class graph)
+    and picks, per e-class, the e-node minimizing
+    cost(n) + sum(best[child_eclass]).
 
-    prob = pulp.LpProblem("egraph_extraction", pulp.LpMinimize)
+    That sum is a tree cost: an e-class reached along two paths is counted
+    twice. It equals the DAG cost whenever every e-class that can be shared
+    (used by two live e-classes, twice by one e-node, or as a root and a
+    child) has only zero-cost e-nodes beneath it, so in that case the
+    result is optimal. Only e-classes reachable from the roots count:
+    analysis nodes (\u00b7.rows, cost(...), ...) point at every tile but
+    can never be extracted. Cyclic graphs, and graphs where sharing could
+    lower the cost, fall back to ilp_extract.
 
-    x = {nid: pulp.LpVariable(f"x_{nid}", cat="Binary") for nid in nodes}
-    y = {ec: pulp.LpVariable(f"y_{ec}", cat="Binary") for ec in eclass_to_nodes}
+    graph_json may also be a prebuilt GraphSoA from intern_graph.
 
-    prob += pulp.lpSum(cost(nid) * x[nid] for nid in nodes)
+    Returns (total_cost, selected_dict) like ilp_extract.
+    """
+    graph = _as_graph(graph_json)
+    result = _dag_dp(graph, node_costs)
+    if result is None:
+        return ilp_extract(graph, node_costs, solver)
+    return result[:2]
 
-    for rec in root_eclasses:
-        if rec in y:
-            prob += y[rec] == 1
 
-    for ec, nids in eclass_to_nodes.items():
-        prob += pulp.lpSum(x[nid] for nid in nids) == y[ec]
+def extract_all_optimal(graph_json, node_costs=None, max_solutions=10,
+                        solver=None):
+    """All optimal extractions, skipping the ILP when the DP settles it.
 
-    for nid in nodes:
-        for child_ec in children_eclasses(nid):
-            if child_ec in y:
-                prob += y[child_ec] >= x[nid]
+    If the dag_extract DP is exact and every e-class it selects has a
+    single best e-node, that extraction is the only optimum. Otherwise
+    (ties, cycles, or costly sharing) this is ilp_extract_all_optimal.
 
-    prob.solve(pulp.PULP_CBC_CMD(msg=0))
+    Returns (optimal_cost, [selected_dict, ...]) like ilp_extract_all_optimal.
+    """
+    graph = _as_graph(graph_json)
+    result = _dag_dp(graph, node_costs)
+    if result is not None and result[2]:
+        return result[0], [result[1]]
+    return ilp_extract_all_optimal(graph, node_costs, max_solutions, solver)
 
-    total_cost = pulp.value(prob.objective)
-    selected = {}
-    for ec, nids in eclass_to_nodes.items():
-        for nid in nids:
-            if pulp.value(x[nid]) == 1:
-                selected[ec] = nid
-                break
 
-    return total_cost, selected
+def _dag_dp(graph, node_costs=None):
+    """The dag_extract DP over a GraphSoA.
+
+    Returns (total_cost, selected_dict, unique), or None when the tree cost
+    is not exact (a cycle, or an e-class with nonzero cost below it that
+    could be shared). unique is True when every selected e-class had one
+    best e-node. No other extraction then reaches total_cost.
+    """
+    graph = _subgraph(graph, _live_nodes(graph))
+    n = len(graph.eclasses)
+    cost = list(graph.node_cost)
+    if node_costs:
+        cost = [node_costs.get(nid, c) for nid, c in zip(graph.nids, cost)]
+
+    # Class graph edges (parent e-class -> child e-class), deduplicated
+    deps = [set() for _ in range(n)]
+    users = [set() for _ in range(n)]
+    repeated = set()
+    for i, ec in enumerate(graph.node_ec):
+        seen = set()
+        for child_ec in graph.child_ecs(i):
+            if child_ec in seen:
+                repeated.add(child_ec)
+            seen.add(child_ec)
+            deps[ec].add(child_ec)
+            users[child_ec].add(ec)
+
+    # Kahn's algorithm, leaves first
+    remaining = [len(d) for d in deps]
+    ready = [ec for ec in range(n) if remaining[ec] == 0]
+    order = []
+    while ready:
+        ec = ready.pop()
+        order.append(ec)
+        for user in users[ec]:
+            remaining[user] -= 1
+            if remaining[user] == 0:
+                ready.append(user)
+    if len(order) < n:
+        return None
+
+    best_cost = [None] * n
+    best_node = [None] * n
+    tied = [False] * n
+    zero_below = [False] * n
+    for ec in order:
+        for i in graph.eclass_to_nodes[ec]:
+            c = cost[i] + sum(best_cost[child_ec] for child_ec in graph.child_ecs(i))
+            if best_cost[ec] is None or c < best_cost[ec]:
+                best_cost[ec], best_node[ec], tied[ec] = c, i, False
+            elif c == best_cost[ec]:
+                tied[ec] = True
+        zero_below[ec] = all(
+            cost[i] == 0 and all(zero_below[child_ec] for child_ec in graph.child_ecs(i))
+            for i in graph.eclass_to_nodes[ec]
+        )
+
+    roots = set(graph.roots)
+    for ec in range(n):
+        shareable = len(users[ec]) + (ec in roots) > 1 or ec in repeated
+        if shareable and not zero_below[ec]:
+            return None
+
+    chosen = {}
+    stack = list(graph.roots)
+    while stack:
+        ec = stack.pop()
+        if ec in chosen:
+            continue
+        chosen[ec] = best_node[ec]
+        stack.extend(graph.child_ecs(best_node[ec]))
+
+    total_cost = sum(cost[i] for i in chosen.values())
+    selected = {graph.eclasses[ec]: graph.nids[i] for ec, i in chosen.items()}
+    return total_cost, selected, not any(tied[ec] for ec in chosen)
 
 
 def format_extraction(graph_json, selected, root_eclass):
-    """Recursively format the selected extraction as a readable string."""
+    """Format the selected extraction as a readable string.
+
+    Pieces are appended to one buffer and joined once at the end. Each
+    e-class is formatted once: a repeat occurrence copies its span of the
+    buffer, so sub-expressions shared in the DAG are not re-walked or
+    re-concatenated for every parent.
+    """
     nodes = graph_json["nodes"]
-    if root_eclass not in selected:
-        return f"<{root_eclass}>"
-    nid = selected[root_eclass]
-    ndata = nodes[nid]
-    op = ndata["op"]
-    children = ndata["children"]
-    if not children:
-        return op
-    child_strs = []
-    for child_nid in children:
-        child_ec = nodes[child_nid]["eclass"]
-        child_strs.append(format_extraction(graph_json, selected, child_ec))
-    return f"{op}({', '.join(child_strs)})"
+    parts = []
+    spans = {}
+
+    def emit(ec):
+        if ec in spans:
+            start, end = spans[ec]
+            parts.extend(parts[start:end])
+            return
+        if ec not in selected:
+            parts.append(f"<{ec}>")
+            return
+        ndata = nodes[selected[ec]]
+        start = len(parts)
+        parts.append(ndata["op"])
+        children = ndata["children"]
+        if children:
+            parts.append("(")
+            for k, child_nid in enumerate(children):
+                if k:
+                    parts.append(", ")
+                emit(nodes[child_nid]["eclass"])
+            parts.append(")")
+        spans[ec] = (start, len(parts))
+
+    emit(root_eclass)
+    return "".join(parts)
 
 
 def compute_traffic_costs(graph_json):
@@ -103,177 +281,513 @@ def compute_traffic_costs(graph_json):
     After ILP extraction selects one e-node per active e-class, the
     transaction dict is {eclass: bytes}. Each e-class counted once,
     so no double-counting. Total cost = sum of the dict values.
-    """
-    nodes = graph_json["nodes"]
 
-    # Collect primitive integer values per eclass
-    eclass_values = {}
-    for nid, ndata in nodes.items():
-        try:
-            eclass_values[ndata["eclass"]] = int(ndata["op"])
-        except ValueError:
-            pass
-
-    # Collect analysis properties per tile eclass from analysis nodes
-    tile_rows = {}
-    tile_cols = {}
-    tile_dtype = {}
-    tile_loop = {}
-    tile_mem = {}
-
-    for nid, ndata in nodes.items():
-        op = ndata["op"]
-        children = ndata["children"]
-        ec = ndata["eclass"]
+    graph_json may also be a prebuilt GraphSoA from intern_graph.
+    """
+    graph = _as_graph(graph_json)
+    node_ec = graph.node_ec
+    n = len(graph.eclasses)
+
+    # One scan: group e-nodes by op, and record the primitive integer value
+    # held by each e-class (None if not an integer)
+    value = [None] * n
+    by_op = [[] for _ in OpID]
+    for i, (op, op_id) in enumerate(zip(graph.op, graph.op_id)):
+        by_op[op_id].append(i)
+        if op_id == OpID.OTHER:
+            try:
+                value[node_ec[i]] = int(op)
+            except ValueError:
+                pass
+
+    shared_region = {node_ec[i] for i in by_op[OpID.SHARED]}
+
+    # Analysis property columns, indexed by tile e-class
+    rows = [0] * n
+    cols = [0] * n
+    dtype = [0] * n
+    loop = [1] * n
+    shared = [False] * n
+    columns = {OpID.ROWS: rows, OpID.COLS: cols,
+               OpID.DTYPE_BYTES: dtype, OpID.LOOP_ITERS: loop}
+
+    for op, column in columns.items():
+        for i in by_op[op]:
+            children = graph.child_ecs(i)
+            if len(children) == 1 and value[node_ec[i]] is not None:
+                column[children[0]] = value[node_ec[i]]
+
+    for i in by_op[OpID.MEM_REGION]:
+        children = graph.child_ecs(i)
+        if len(children) == 1:
+            shared[children[0]] = node_ec[i] in shared_region
+
+    # Whole-column arithmetic per e-class, then one gather per e-node
+    tile_bytes = [r * c * d for r, c, d in zip(rows, cols, dtype)]
+    moved = [tb * li for tb, li in zip(tile_bytes, loop)]
+    smem_read = [tb if sh else 0 for tb, sh in zip(tile_bytes, shared)]
+
+    copies = [i for op in (OpID.LDS, OpID.LDR, OpID.STS, OpID.STG) for i in by_op[op]]
+    costs = _node_traffic(len(graph.nids), copies, by_op[OpID.WGMMA], node_ec,
+                          graph.children_offsets, graph.children_flat,
+                          moved, smem_read, loop)
+    return dict(zip(graph.nids, costs))
+
+
+def _node_traffic(n, copies, wgmmas, node_ec, children_offsets, children_flat,
+                  moved, smem_read, loop):
+    """Per-e-node traffic from the per-e-class columns, as a flat list.
+
+    copies and wgmmas are e-node indices; the rest are GraphSoA columns
+    and the per-e-class columns built by compute_traffic_costs.
+    """
+    costs = [0] * n
+    for i in copies:
+        costs[i] = moved[node_ec[i]]
 
-        if len(children) != 1:
+    for i in wgmmas:
+        start = children_offsets[i]
+        if children_offsets[i + 1] - start != 2:
             continue
-        tile_ec = nodes[children[0]]["eclass"]
-
-        if op == "\u00b7.rows" and ec in eclass_values:
-            tile_rows[tile_ec] = eclass_values[ec]
-        elif op == "\u00b7.cols" and ec in eclass_values:
-            tile_cols[tile_ec] = eclass_values[ec]
-        elif op == "\u00b7.dtype_bytes" and ec in eclass_values:
-            tile_dtype[tile_ec] = eclass_values[ec]
-        elif op == "\u00b7.loop_iters" and ec in eclass_values:
-            tile_loop[tile_ec] = eclass_values[ec]
-        elif op == "\u00b7.mem_region":
-            tile_mem[tile_ec] = ec
-
-    # Map MemRegion eclasses to names
-    mem_names = {}
-    for nid, ndata in nodes.items():
-        if ndata["op"] in ("MemRegion.SHARED", "MemRegion.GLOBAL", "MemRegion.REGISTERS"):
-            mem_names[ndata["eclass"]] = ndata["op"]
-
-    def tile_bytes(tile_ec):
-        r = tile_rows.get(tile_ec, 0)
-        c = tile_cols.get(tile_ec, 0)
-        d = tile_dtype.get(tile_ec, 0)
-        return r * c * d
-
-    def loop_iters(tile_ec):
-        return tile_loop.get(tile_ec, 1)
-
-    def mem_region(tile_ec):
-        mr_ec = tile_mem.get(tile_ec)
-        return mem_names.get(mr_ec, "") if mr_ec else ""
-
-    costs = {}
-    for nid, ndata in nodes.items():
-        op = ndata["op"]
-        ec = ndata["eclass"]
-        children = ndata["children"]
-
-        if op in ("Tile.LDS", "Tile.LDR", "Tile.STS", "Tile.STG"):
-            costs[nid] = tile_bytes(ec) * loop_iters(ec)
-        elif op == "Tile.WGMMA" and len(children) == 2:
-            # Implicit smem->reg load for shared operands
-            a_ec = nodes[children[0]]["eclass"]
-            b_ec = nodes[children[1]]["eclass"]
-            li = loop_iters(ec)
-            c = 0
-            if mem_region(a_ec) == "MemRegion.SHARED":
-                c += tile_bytes(a_ec)
-            if mem_region(b_ec) == "MemRegion.SHARED":
-                c += tile_bytes(b_ec)
-            costs[nid] = c * li
-        else:
-            costs[nid] = 0
+        # Implicit smem->reg load for shared operands
+        a, b = children_flat[start], children_flat[start + 1]
+        costs[i] = (smem_read[a] + smem_read[b]) * loop[node_ec[i]]
 
     return costs
 
 
-def _ilp_solve(graph_json, node_costs, target_cost=None, excluded=None):
-    """Build and solve the egraph ILP from scratch.
+@dataclass
+class GraphSoA:
+    """Columnar (structure-of-arrays) view of a serialized egraph.
 
-    target_cost: if given, adds an equality constraint fixing the objective
-                 to that value (used for enumerating all optimal solutions).
-    excluded:    list of previously found selected dicts; a no-good cut is
-                 added for each so the solver must find a different solution.
+    E-nodes and e-classes are interned to dense int32 indices. The child
+    e-classes of e-node i are
+    children_flat[children_offsets[i]:children_offsets[i + 1]].
+    nids and eclasses decode indices back to JSON ids.
+    """
+    nids: list               # e-node index -> node id
+    node_index: dict         # node id -> e-node index
+    op: list                 # e-node index -> op string
+    op_id: array             # e-node index -> OpID
+    node_cost: list          # e-node index -> cost stored in the JSON
+    node_ec: array           # e-node index -> e-class index
+    children_offsets: array  # e-node index -> start in children_flat (n + 1 entries)
+    children_flat: array     # child e-class indices, concatenated
+    eclasses: list           # e-class index -> e-class id
+    eclass_to_nodes: list    # e-class index -> list of e-node indices
+    roots: list              # root e-class indices
 
-    Returns (total_cost, selected_dict) or (None, None) if infeasible.
+    def child_ecs(self, i):
+        return self.children_flat[self.children_offsets[i]:self.children_offsets[i + 1]]
+
+
+def _eclass_of(graph_json):
+    """Flat {node_id: eclass} map, resolving children without a nested lookup."""
+    return {nid: ndata["eclass"] for nid, ndata in graph_json["nodes"].items()}
+
+
+def intern_graph(graph_json):
+    """Build the GraphSoA for graph_json in one pass over its nodes.
+
+    Build it once and pass it to compute_traffic_costs, ilp_extract and
+    ilp_extract_all_optimal in place of graph_json to share the interning.
     """
     nodes = graph_json["nodes"]
-    root_eclasses = graph_json["root_eclasses"]
+    nids = list(nodes)
+    eclass_of = _eclass_of(graph_json)
+    node_index = {nid: i for i, nid in enumerate(nids)}
+
+    ec_index = {}
+    node_ec = array("i", [ec_index.setdefault(eclass_of[nid], len(ec_index))
+                          for nid in nids])
+
+    eclass_to_nodes = [[] for _ in ec_index]
+    for i, ec in enumerate(node_ec):
+        eclass_to_nodes[ec].append(i)
+
+    ops = [nodes[nid]["op"] for nid in nids]
+
+    children_offsets = array("i", [0])
+    children_flat = array("i")
+    for nid in nids:
+        children_flat.extend(ec_index[eclass_of[child]] for child in nodes[nid]["children"])
+        children_offsets.append(len(children_flat))
+
+    return GraphSoA(
+        nids=nids,
+        node_index=node_index,
+        op=ops,
+        op_id=array("b", [OP_IDS.get(op, OpID.OTHER) for op in ops]),
+        node_cost=[nodes[nid]["cost"] for nid in nids],
+        node_ec=node_ec,
+        children_offsets=children_offsets,
+        children_flat=children_flat,
+        eclasses=list(ec_index),
+        eclass_to_nodes=eclass_to_nodes,
+        roots=[ec_index[ec] for ec in graph_json["root_eclasses"] if ec in ec_index],
+    )
+
+
+def _as_graph(graph):
+    """Accept either a serialized egraph dict or a prebuilt GraphSoA."""
+    return graph if isinstance(graph, GraphSoA) else intern_graph(graph)
+
+
+def _subgraph(graph, keep):
+    """GraphSoA over the e-nodes in keep (indices into graph).
+
+    keep must still cover every child e-class of its nodes (see _live_nodes,
+    _undominated). E-classes left without nodes are dropped and the rest
+    renumbered.
+    """
+    ec_index = {}
+    node_ec = array("i", [ec_index.setdefault(graph.node_ec[i], len(ec_index))
+                          for i in keep])
+
+    eclass_to_nodes = [[] for _ in ec_index]
+    for j, ec in enumerate(node_ec):
+        eclass_to_nodes[ec].append(j)
+
+    children_offsets = array("i", [0])
+    children_flat = array("i")
+    for i in keep:
+        children_flat.extend(ec_index[ec] for ec in graph.child_ecs(i))
+        children_offsets.append(len(children_flat))
+
+    nids = [graph.nids[i] for i in keep]
+    return GraphSoA(
+        nids=nids,
+        node_index={nid: j for j, nid in enumerate(nids)},
+        op=[graph.op[i] for i in keep],
+        op_id=array("b", [graph.op_id[i] for i in keep]),
+        node_cost=[graph.node_cost[i] for i in keep],
+        node_ec=node_ec,
+        children_offsets=children_offsets,
+        children_flat=children_flat,
+        eclasses=[graph.eclasses[ec] for ec in ec_index],
+        eclass_to_nodes=eclass_to_nodes,
+        roots=[ec_index[ec] for ec in graph.roots if ec in ec_index],
+    )
+
+
+def _live_nodes(graph):
+    """Indices of the e-nodes in e-classes reachable from the roots.
+
+    Analysis nodes (\u00b7.rows, \u00b7.mem_region, cost(...), ...) point at
+    their tile rather than being pointed at, so they are never reachable
+    and can be left out of the ILP. Primitives under a live node stay.
+    """
+    live = set(graph.roots)
+    stack = list(live)
+    while stack:
+        for i in graph.eclass_to_nodes[stack.pop()]:
+            for ec in graph.child_ecs(i):
+                if ec not in live:
+                    live.add(ec)
+                    stack.append(ec)
+
+    return [i for i, ec in enumerate(graph.node_ec) if ec in live]
+
+
+def _undominated(graph, keep, node_costs=None, strict=False):
+    """Drop e-nodes that another node in the same e-class dominates.
+
+    n' dominates n when cost(n') <= cost(n) and the child e-classes of n'
+    are a subset of those of n: any solution using n stays feasible and no
+    more expensive with n' instead. Of several equivalent nodes the first
+    is kept. With strict=True only nodes that can never be in an optimal
+    solution (cost(n') < cost(n)) are dropped, so every optimum survives.
+    """
+    eclass_members = {}
+    for i in keep:
+        eclass_members.setdefault(graph.node_ec[i], []).append(i)
+
+    survivors = []
+    for members in eclass_members.values():
+        if len(members) == 1:
+            survivors.extend(members)
+            continue
+        keys = []
+        for i in members:
+            cost = graph.node_cost[i]
+            if node_costs:
+                cost = node_costs.get(graph.nids[i], cost)
+            keys.append((cost, frozenset(graph.child_ecs(i))))
+
+        for k, (cost, children) in enumerate(keys):
+            dominated = any(
+                j != k and other_children <= children and (
+                    other_cost < cost or not strict and other_cost == cost
+                    and (other_children < children or j < k))
+                for j, (other_cost, other_children) in enumerate(keys))
+            if not dominated:
+                survivors.append(members[k])
+
+    return sorted(survivors)
+
+
+def _ilp_graph(graph, node_costs, strict=False):
+    """GraphSoA of the live, undominated nodes the ILP is built over."""
+    return _subgraph(graph, _undominated(graph, _live_nodes(graph), node_costs, strict))
+
+
+def _build_model(graph, node_costs):
+    """Lay out the extraction ILP as sparse rows, independent of any solver.
+
+    Columns are x_n for every e-node followed by y_c for every e-class, in
+    the index order of the GraphSoA. Each row is
+    (col_indices, coefficients, lower, upper). Only the x_n need to be
+    integer: y_c = sum(x_n) with y_c <= 1 is then integral on its own.
+
+    Returns (col_cost, rows, num_int), where the first num_int columns
+    are binary and the rest continuous in [0, 1].
+    """
+    n = len(graph.nids)
+    if node_costs:
+        x_cost = [node_costs.get(nid, c) for nid, c in zip(graph.nids, graph.node_cost)]
+    else:
+        x_cost = list(graph.node_cost)
+    col_cost = x_cost + [0] * len(graph.eclasses)
+    rows = []
 
-    eclass_to_nodes = {}
-    for nid, ndata in nodes.items():
-        ec = ndata["eclass"]
-        eclass_to_nodes.setdefault(ec, []).append(nid)
+    for ec in graph.roots:
+        rows.append(([n + ec], [1], 1, 1))
 
-    def children_eclasses(nid):
-        return [nodes[child]["eclass"] for child in nodes[nid]["children"]]
+    # sum(x_n) - y_c == 0
+    for ec, members in enumerate(graph.eclass_to_nodes):
+        rows.append((members + [n + ec], [1] * len(members) + [-1], 0, 0))
 
-    def cost(nid):
-        if node_costs and nid in node_costs:
-            return node_costs[nid]
-        return nodes[nid]["cost"]
+    # y_child - x_n >= 0
+    for i in range(n):
+        for child_ec in graph.child_ecs(i):
+            rows.append(([n + child_ec, i], [1, -1], 0, math.inf))
 
-    prob = pulp.LpProblem("egraph_extraction", pulp.LpMinimize)
-    x = {nid: pulp.LpVariable(f"x_{nid}", cat="Binary") for nid in nodes}
-    y = {ec: pulp.LpVariable(f"y_{ec}", cat="Binary") for ec in eclass_to_nodes}
+    return col_cost, rows, n
 
-    obj = pulp.lpSum(cost(nid) * x[nid] for nid in nodes)
-    prob += obj
 
-    if target_cost is not None:
-        prob += obj == target_cost
+def _no_good_row(graph, selected):
+    """Row forcing the next solution to differ in at least one selected node."""
+    prev_nodes = [graph.node_index[nid] for nid in selected.values()]
+    return prev_nodes, [1] * len(prev_nodes), -math.inf, len(prev_nodes) - 1
 
-    for rec in root_eclasses:
-        if rec in y:
-            prob += y[rec] == 1
 
-    for ec, nids in eclass_to_nodes.items():
-        prob += pulp.lpSum(x[nid] for nid in nids) == y[ec]
+class _HighsModel:
+    """The extraction ILP held in a live highspy.Highs instance (no files).
 
-    for nid in nodes:
-        for child_ec in children_eclasses(nid):
-            if child_ec in y:
-                prob += y[child_ec] >= x[nid]
+    Rows added after construction are appended to the same model, so
+    re-solving skips rebuilding it and HiGHS keeps its internal state.
+    """
+
+    def __init__(self, col_cost, rows, num_int):
+        starts, indices, values = [0], [], []
+        for idx, coef, _, _ in rows:
+            indices.extend(idx)
+            values.extend(coef)
+            starts.append(len(indices))
+
+        lp = highspy.HighsLp()
+        lp.num_col_ = len(col_cost)
+        lp.num_row_ = len(rows)
+        lp.col_cost_ = col_cost
+        lp.col_lower_ = [0] * len(col_cost)
+        lp.col_upper_ = [1] * len(col_cost)
+        lp.row_lower_ = [self._clip(lo) for _, _, lo, _ in rows]
+        lp.row_upper_ = [self._clip(hi) for _, _, _, hi in rows]
+        lp.a_matrix_.format_ = highspy.MatrixFormat.kRowwise
+        lp.a_matrix_.num_col_ = len(col_cost)
+        lp.a_matrix_.num_row_ = len(rows)
+        lp.a_matrix_.start_ = starts
+        lp.a_matrix_.index_ = indices
+        lp.a_matrix_.value_ = values
+        lp.integrality_ = ([highspy.HighsVarType.kInteger] * num_int
+                           + [highspy.HighsVarType.kContinuous] * (len(col_cost) - num_int))
+
+        self.h = highspy.Highs()
+        self.h.setOptionValue("output_flag", False)
+        self.h.passModel(lp)
+
+    @staticmethod
+    def _clip(bound):
+        return max(-highspy.kHighsInf, min(bound, highspy.kHighsInf))
+
+    def add_row(self, idx, coef, lo, hi):
+        self.h.addRow(self._clip(lo), self._clip(hi), len(idx), idx, coef)
+
+    def solve(self, relax=False):
+        """Returns (objective, column_values) or None if not optimal.
+
+        relax: solve the LP relaxation, ignoring integrality.
+        """
+        self.h.setOptionValue("solve_relaxation", relax)
+        self.h.run()
+        if self.h.getModelStatus() != highspy.HighsModelStatus.kOptimal:
+            return None
+        return (self.h.getInfo().objective_function_value,
+                list(self.h.getSolution().col_value))
+
+
+class _PulpModel:
+    """The extraction ILP as a PuLP problem solved with a PuLP solver.
+
+    Added rows extend the same LpProblem; PuLP re-solves it from the solver's
+    point of view, but the Python-side model is only built once.
+    """
+
+    def __init__(self, col_cost, rows, num_int, solver):
+        self.solver = solver
+        self.num_int = num_int
+        self.prob = pulp.LpProblem("egraph_extraction", pulp.LpMinimize)
+        self.cols = [pulp.LpVariable(f"v_{i}", 0, 1,
+                                     cat=pulp.LpInteger if i < num_int else pulp.LpContinuous)
+                     for i in range(len(col_cost))]
+        # LpAffineExpression straight from (variable, coefficient) pairs skips
+        # the per-term products lpSum would build and merge
+        # Zero-cost columns are left out of the objective
+        self.prob += pulp.LpAffineExpression((v, c) for v, c in zip(self.cols, col_cost) if c)
+        for row in rows:
+            self.add_row(*row)
+
+    def add_row(self, idx, coef, lo, hi):
+        expr = pulp.LpAffineExpression([(self.cols[i], c) for i, c in zip(idx, coef)])
+        if lo == hi:
+            self.prob += expr == lo
+            return
+        if lo > -math.inf:
+            self.prob += expr >= lo
+        if hi < math.inf:
+            self.prob += expr <= hi
+
+    def solve(self, relax=False):
+        """Returns (objective, column_values) or None if not optimal.
+
+        relax: solve the LP relaxation, ignoring integrality.
+        """
+        cat = pulp.LpContinuous if relax else pulp.LpInteger
+        for v in self.cols[:self.num_int]:
+            v.cat = cat
+        self.prob.solve(self.solver)
+        if pulp.LpStatus[self.prob.status] != "Optimal":
+            return None
+        return pulp.value(self.prob.objective), [v.value() for v in self.cols]
+
+
+class _MipModel:
+    """The extraction ILP held in a python-mip model, solved by in-process CBC.
+
+    Like _HighsModel, no files or subprocesses are involved and added rows
+    go into the same live model.
+    """
 
-    # No-good cuts: each prior solution must differ in at least one selected node
-    for prev in (excluded or []):
-        prev_nids = list(prev.values())
-        prob += pulp.lpSum(x[nid] for nid in prev_nids) <= len(prev_nids) - 1
+    def __init__(self, col_cost, rows, num_int):
+        self.m = mip.Model(sense=mip.MINIMIZE, solver_name=mip.CBC)
+        self.m.verbose = 0
+        self.cols = [self.m.add_var(lb=0, ub=1,
+                                    var_type=mip.BINARY if i < num_int else mip.CONTINUOUS)
+                     for i in range(len(col_cost))]
+        self.m.objective = mip.xsum(c * v for c, v in zip(col_cost, self.cols) if c)
+        for row in rows:
+            self.add_row(*row)
+
+    def add_row(self, idx, coef, lo, hi):
+        expr = mip.xsum(c * self.cols[i] for i, c in zip(idx, coef))
+        if lo == hi:
+            self.m += expr == lo
+            return
+        if lo > -math.inf:
+            self.m += expr >= lo
+        if hi < math.inf:
+            self.m += expr <= hi
+
+    def solve(self, relax=False):
+        """Returns (objective, column_values) or None if not optimal.
+
+        relax: not offered here, since CBC logs pure LP solves to stdout
+               regardless of verbose. Returns None, so
+               _solve_relaxed_first goes straight to the MIP.
+        """
+        if relax or self.m.optimize() != mip.OptimizationStatus.OPTIMAL:
+            return None
+        return self.m.objective_value, [v.x for v in self.cols]
+
+
+def _new_model(col_cost, rows, num_int, solver=None):
+    """In-process highspy, then python-mip, when no PuLP solver was
+    requested; otherwise (or if neither is installed) PuLP."""
+    if solver is None and highspy is not None:
+        return _HighsModel(col_cost, rows, num_int)
+    if solver is None and mip is not None:
+        return _MipModel(col_cost, rows, num_int)
+    return _PulpModel(col_cost, rows, num_int, solver or default_solver())
+
+
+def _solve_relaxed_first(model):
+    """Solve the LP relaxation and keep it if it is already integral.
+
+    An integral LP optimum is also MIP-optimal, so the MIP solve is skipped.
+    If the relaxation is fractional, the MIP is solved as usual.
+    """
+    solution = model.solve(relax=True)
+    if solution is not None and all(v is None or abs(v - round(v)) <= 1e-6
+                                    for v in solution[1]):
+        return solution
+    return model.solve()
 
-    prob.solve(pulp.PULP_CBC_CMD(msg=0))
 
-    if pulp.LpStatus[prob.status] != "Optimal":
+def _decode(graph, solution):
+    """Map a (objective, column_values) solution back to (cost, selected)."""
+    if solution is None:
         return None, None
 
-    total_cost = pulp.value(prob.objective)
+    total_cost, values = solution
     selected = {}
-    for ec, nids in eclass_to_nodes.items():
-        for nid in nids:
-            if pulp.value(x[nid]) is not None and pulp.value(x[nid]) > 0.5:
-                selected[ec] = nid
-                break
+    for i, v in enumerate(values[:len(graph.nids)]):
+        if v is not None and v > 0.5:
+            selected.setdefault(graph.eclasses[graph.node_ec[i]], graph.nids[i])
 
     return total_cost, selected
 
 
-def ilp_extract_all_optimal(graph_json, node_costs=None, max_solutions=10):
+def _ilp_solve(graph, node_costs, solver=None, relax_first=False):
+    """Build and solve the egraph ILP over a GraphSoA.
+
+    Returns (total_cost, selected_dict) or (None, None) if infeasible.
+    """
+    model = _new_model(*_build_model(graph, node_costs), solver)
+    return _decode(graph, _solve_relaxed_first(model) if relax_first else model.solve())
+
+
+def ilp_extract_all_optimal(graph_json, node_costs=None, max_solutions=10,
+                            solver=None):
     """Find all optimal DAG extractions via ILP using no-good cuts.
 
-    After the first solution is found at cost C*, additional solves fix
-    the objective to C* and add a no-good cut for each prior solution,
-    forcing the solver to find a structurally different extraction with
-    the same total cost.
+    After the first solution is found at cost C*, the objective is fixed to
+    C* and a no-good cut is appended for each prior solution, forcing the
+    solver to find a structurally different extraction with the same total
+    cost. Cuts are added to the one live model instead of rebuilding it.
+    No MIP start is passed to the re-solves: the only incumbent at hand is
+    the previous solution, which its own cut has just made infeasible.
+
+    graph_json may also be a prebuilt GraphSoA from intern_graph.
 
     Returns (optimal_cost, [selected_dict_1, selected_dict_2, ...]).
     The list has length 1 if the optimal solution is unique.
     """
-    optimal_cost, first_selected = ilp_extract(graph_json, node_costs)
+    graph = _ilp_graph(_as_graph(graph_json), node_costs, strict=True)
+    col_cost, rows, num_int = _build_model(graph, node_costs)
+    model = _new_model(col_cost, rows, num_int, solver)
+
+    optimal_cost, first_selected = _decode(graph, model.solve())
     solutions = [first_selected]
 
+    # Costs are integer byte counts, but solvers report the objective as a
+    # float (e.g. 1081343.9999); truncating it would make the row infeasible
+    target = round(optimal_cost)
+    priced = [i for i, c in enumerate(col_cost) if c]
+    model.add_row(priced, [col_cost[i] for i in priced], target, target)
+
     for _ in range(max_solutions - 1):
-        _, next_selected = _ilp_solve(
-            graph_json, node_costs,
-            target_cost=int(optimal_cost),
-            excluded=solutions,
-        )
+        model.add_row(*_no_good_row(graph, solutions[-1]))
+        _, next_selected = _decode(graph, model.solve())
         if next_selected is None:
             break
         solutions.append(next_selected)
@@ -282,17 +796,16 @@ def ilp_extract_all_optimal(graph_json, node_costs=None, max_solutions=10):
 
 
 def main(json_path):
-    with open(json_path) as f:
-        graph_json = json.load(f)
+    graph_json = load_graph_json(json_path)
 
     traffic_costs = compute_traffic_costs(graph_json)
 
-    print("ILP extraction (traffic cost, optimal DAG):")
-    total_cost, selected = ilp_extract(graph_json, traffic_costs)
+    print("Optimal DAG extraction (traffic cost):")
+    total_cost, selected = dag_extract(graph_json, traffic_costs)
     root_ec = graph_json["root_eclasses"][0]
     expr = format_extraction(graph_json, selected, root_ec)
     print(f"  {expr}")
-    print(f"  cost: {int(total_cost)} bytes")
+    print(f"  cost: {round(total_cost)} bytes")
 
     # Print the transaction dict: {eclass: bytes moved}
     nodes = graph_json["nodes"]
@@ -1,11 +1,13 @@
 """
 Run the full attention rewrite pipeline:
   1. attention.py:  build egraph, apply rewrites, serialize to egraph.json
-  2. extract.py:    read egraph.json, run ILP extraction with traffic costs
+  2. extract.py:    extract (DP or ILP) with traffic costs on the serialized egraph
   3. visualize.py:  render egraph diagrams (plain + cost-annotated)
 
 Usage:
-  python run.py
+  python run.py              # build, extract, print
+  python run.py --visualize  # ...and render the egraph diagrams
+  python run.py --rebuild    # re-run egglog even if egraph.json is current
 
 Or run each step separately:
   python attention.py    # outputs egraph.json
@@ -13,16 +15,21 @@ Or run each step separately:
 
 Requirements:
   pip install egglog pulp graphviz
+  pip install highspy   # optional, solves the ILP in-process
+  pip install mip       # optional, in-process CBC when highspy is absent
+  pip install orjson    # optional, faster egraph.json parsing
 """
 
-import json
+import argparse
+import hashlib
 import os
 from attention import build_and_serialize
-from extract import compute_traffic_costs, ilp_extract_all_optimal, format_extraction
-from visualize import visualize
+from extract import (compute_traffic_costs, extract_all_optimal,
+                     format_extraction, intern_graph, load_graph_json)
 
 OUTPUT_DIR = "output"
 EGRAPH_JSON = os.path.join(OUTPUT_DIR, "egraph.json")
+EGRAPH_KEY = EGRAPH_JSON + ".key"
 
 # Tile specs: name -> (rows, cols, dtype_bytes, loop_iters)
 # Q is loaded once (loop_iters=1), K and V are streamed (loop_iters=trip count).
@@ -33,51 +40,80 @@ TILES = {
 }
 ACCUM_DTYPE_BYTES = 4  # fp32 accumulator output from WGMMA
 
+parser = argparse.ArgumentParser(description="Run the attention rewrite pipeline.")
+parser.add_argument("-v", "--visualize", action="store_true",
+                    help="also render egraph.svg and egraph-costs.svg (needs graphviz)")
+parser.add_argument("--rebuild", action="store_true",
+                    help="rebuild egraph.json even if its inputs are unchanged")
+args = parser.parse_args()
+
 os.makedirs(OUTPUT_DIR, exist_ok=True)
 
-print("Building egraph and serializing to JSON")
-build_and_serialize(EGRAPH_JSON, tiles=TILES, accum_dtype_bytes=ACCUM_DTYPE_BYTES)
+# egraph.json depends only on the tile specs and the rules in attention.py,
+# so a hash of both says whether the egglog run can be skipped
+with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), "attention.py"), "rb") as f:
+    rules_src = f.read()
+key = hashlib.sha256(repr((TILES, ACCUM_DTYPE_BYTES)).encode() + rules_src).hexdigest()
+
+cached_key = None
+if not args.rebuild and os.path.exists(EGRAPH_JSON) and os.path.exists(EGRAPH_KEY):
+    with open(EGRAPH_KEY) as f:
+        cached_key = f.read().strip()
+
+if cached_key == key:
+    print(f"{EGRAPH_JSON} is up to date, skipping the egglog run (--rebuild to force)")
+    graph_json = load_graph_json(EGRAPH_JSON)
+else:
+    print("Building egraph and serializing to JSON")
+    # The serialized egraph for ILP extraction and visualization, kept in memory
+    # rather than read back from egraph.json
+    graph_json = build_and_serialize(EGRAPH_JSON, tiles=TILES,
+                                     accum_dtype_bytes=ACCUM_DTYPE_BYTES)
+    with open(EGRAPH_KEY, "w") as f:
+        f.write(key)
 print()
 
-# Load the serialized egraph for ILP extraction and visualization
-with open(EGRAPH_JSON) as f:
-    graph_json = json.load(f)
-
-print("Running ILP extraction (all optimal solutions)")
-traffic_costs = compute_traffic_costs(graph_json)
-total_cost, all_solutions = ilp_extract_all_optimal(graph_json, traffic_costs)
+print("Running extraction (all optimal solutions)")
+# Intern the nodes into flat columns once for both the cost pass and the ILP
+graph = intern_graph(graph_json)
+traffic_costs = compute_traffic_costs(graph)
+# DP when it proves a unique optimum, otherwise the ILP with no-good cuts
+total_cost, all_solutions = extract_all_optimal(graph, traffic_costs)
 root_ec = graph_json["root_eclasses"][0]
 nodes = graph_json["nodes"]
 
-print(f"Optimal cost: {int(total_cost)} bytes")
+print(f"Optimal cost: {round(total_cost)} bytes")
 print()
 
+# Child e-classes of every node, shared by the reachability walk of each solution
+children_ec_by_nid = {nid: [nodes[c]["eclass"] for c in ndata["children"]]
+                      for nid, ndata in nodes.items()}
+
 def live_eclasses(selected, root):
     """Return the subset of selected that is reachable from root."""
-    visited = set()
+    if root not in selected:
+        return {}
+    visited = {root}
     stack = [root]
     while stack:
-        ec = stack.pop()
-        if ec in visited or ec not in selected:
-            continue
-        visited.add(ec)
-        for child_nid in nodes[selected[ec]]["children"]:
-            stack.append(nodes[child_nid]["eclass"])
+        for child_ec in children_ec_by_nid[selected[stack.pop()]]:
+            if child_ec not in visited and child_ec in selected:
+                visited.add(child_ec)
+                stack.append(child_ec)
     return {ec: selected[ec] for ec in visited}
 
 # Deduplicate: ILP may find solutions that differ only in dead (unreachable)
 # e-classes. Filter each solution to live e-classes only, then deduplicate
-# by root-reachable expression so coloring reflects only meaningful selections.
-seen_exprs = {}
+# by the sorted (eclass, node) pairs of what is left, so coloring reflects
+# only meaningful selections. Only the survivors get formatted.
+seen = {}
 for selected in all_solutions:
     live = live_eclasses(selected, root_ec)
-    expr = format_extraction(graph_json, live, root_ec)
-    if expr not in seen_exprs:
-        seen_exprs[expr] = live
-unique_solutions = list(seen_exprs.values())
+    seen.setdefault(tuple(sorted(live.items())), live)
+unique_solutions = list(seen.values())
 
 print(f"{len(unique_solutions)} unique optimal structure(s) found"
-      f" ({len(all_solutions)} total ILP solutions before deduplication):")
+      f" ({len(all_solutions)} total solutions before deduplication):")
 for i, selected in enumerate(unique_solutions):
     expr = format_extraction(graph_json, selected, root_ec)
     print(f"  Solution {i + 1}: {expr}")
@@ -91,13 +127,16 @@ for ec, nid in sorted(unique_solutions[0].items()):
         print(f"  {ec:30s}  {op:20s}  {c} bytes")
 print()
 
-# Build node_costs: {node_id: bytes} for every node selected in any solution.
-# Includes 0-cost nodes so the cost row shows up on all selected nodes.
-node_costs = {}
-for sol in unique_solutions:
-    for nid in sol.values():
-        node_costs[nid] = traffic_costs.get(nid, 0)
+if args.visualize:
+    from visualize import visualize
+
+    # Build node_costs: {node_id: bytes} for every node selected in any solution.
+    # Includes 0-cost nodes so the cost row shows up on all selected nodes.
+    node_costs = {}
+    for sol in unique_solutions:
+        for nid in sol.values():
+            node_costs[nid] = traffic_costs.get(nid, 0)
 
-print("Generating egraph visualizations")
-visualize(graph_json, output_path=os.path.join(OUTPUT_DIR, "egraph"),
-          node_costs=node_costs, all_selected=unique_solutions)
+    print("Generating egraph visualizations")
+    visualize(graph_json, output_path=os.path.join(OUTPUT_DIR, "egraph"),
+              node_costs=node_costs, all_selected=unique_solutions)
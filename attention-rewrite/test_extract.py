@@ -0,0 +1,172 @@
+"""Check extract.py on small hand-built serialized egraphs.
+
+Run:  python test_extract.py   (or pytest)
+"""
+import extract as ex
+
+
+def make_graph(nodes, roots):
+    """Serialized egraph dict from {nid: (eclass, op, cost, [child nids])}."""
+    return {
+        "nodes": {nid: {"eclass": ec, "op": op, "cost": cost, "children": children}
+                  for nid, (ec, op, cost, children) in nodes.items()},
+        "root_eclasses": roots,
+    }
+
+
+# r: two ways to produce the root; the cheaper tree goes through the leaf l2.
+# The analysis node "rows" points at l1 like the attention graphs' ·.rows
+# nodes do, which makes l1 look shared unless only live classes are counted.
+TREE = make_graph({
+    "a":    ("r", "Tile.WGMMA", 1, ["l1"]),
+    "b":    ("r", "Tile.WGMMA", 3, ["l2"]),
+    "l1":   ("c1", "Tile.LDS", 5, []),
+    "l2":   ("c2", "Tile.LDS", 1, []),
+    "rows": ("m", "·.rows", 0, ["l1"]),
+}, ["r"])
+
+# Two optima of cost 4: a + l1 and b + l2
+TIED = make_graph({
+    "a":  ("r", "Tile.WGMMA", 1, ["l1"]),
+    "b":  ("r", "Tile.WGMMA", 2, ["l2"]),
+    "l1": ("c1", "Tile.LDS", 3, []),
+    "l2": ("c2", "Tile.LDS", 2, []),
+}, ["r"])
+TIED_OPTIMA = [{"r": "a", "c1": "l1"}, {"r": "b", "c2": "l2"}]
+
+# TIED plus nodes the dominance pruning can drop: a2 has a's cost with
+# extra children, b2 has b's children at a higher cost
+PRUNABLE = make_graph({
+    **{nid: (n["eclass"], n["op"], n["cost"], n["children"])
+       for nid, n in TIED["nodes"].items()},
+    "a2": ("r", "Tile.WGMMA", 1, ["l1", "l2"]),
+    "b2": ("r", "Tile.WGMMA", 5, ["l2"]),
+}, ["r"])
+
+
+def backends():
+    """(name, model factory) for every ILP backend installed here."""
+    found = []
+    if ex.highspy is not None:
+        found.append(("highspy", ex._HighsModel))
+    if ex.mip is not None:
+        found.append(("python-mip", ex._MipModel))
+    for solver in (ex.pulp.HiGHS_CMD(msg=False), ex.pulp.PULP_CBC_CMD(msg=0)):
+        if solver.available():
+            found.append((f"pulp {solver.name}",
+                          lambda *model, solver=solver: ex._PulpModel(*model, solver)))
+    return found
+
+
+def test_dag_dp_ignores_analysis_users():
+    result = ex._dag_dp(ex.intern_graph(TREE))
+    assert result is not None
+    total_cost, selected, unique = result
+    assert total_cost == 4
+    assert selected == {"r": "b", "c2": "l2"}
+    assert unique
+
+
+def test_dag_dp_rejects_costly_sharing():
+    # l is used by both children of the root, so the tree cost counts it twice
+    shared = make_graph({
+        "root": ("r", "Tile.WGMMA", 0, ["p", "q"]),
+        "p":    ("cp", "Tile.LDR", 1, ["l"]),
+        "q":    ("cq", "Tile.LDR", 1, ["l"]),
+        "l":    ("cl", "Tile.LDS", 5, []),
+    }, ["r"])
+    assert ex._dag_dp(ex.intern_graph(shared)) is None
+
+
+def test_extract_all_optimal_skips_ilp_for_unique_dp_optimum():
+    def no_ilp(*args, **kwargs):
+        raise AssertionError("ILP enumeration should be skipped")
+
+    saved, ex.ilp_extract_all_optimal = ex.ilp_extract_all_optimal, no_ilp
+    try:
+        assert ex.extract_all_optimal(TREE) == (4, [{"r": "b", "c2": "l2"}])
+    finally:
+        ex.ilp_extract_all_optimal = saved
+
+
+def test_enumeration_survives_float_objective():
+    # Solvers report objectives as floats, e.g. 3.9999 for an optimum of 4
+    real_new_model = ex._new_model
+
+    def new_model(*args, **kwargs):
+        model = real_new_model(*args, **kwargs)
+        solve = model.solve
+        first = [True]
+
+        def solve_once_low(relax=False):
+            solution = solve(relax)
+            if solution is not None and first[0]:
+                first[0] = False
+                return solution[0] - 1e-4, solution[1]
+            return solution
+
+        model.solve = solve_once_low
+        return model
+
+    ex._new_model = new_model
+    try:
+        _, solutions = ex.ilp_extract_all_optimal(TIED)
+    finally:
+        ex._new_model = real_new_model
+    assert sorted(solutions, key=lambda s: s["r"]) == TIED_OPTIMA
+
+
+def test_format_extraction_repeats_shared_subterms():
+    # out reads the shared tile q twice; a selection without l prints <c>
+    graph = make_graph({
+        "out": ("o", "Tile.WGMMA", 1, ["q", "q"]),
+        "q":   ("s", "Tile.Elementwise", 1, ["l"]),
+        "l":   ("c", "Tile.LDS", 1, []),
+    }, ["o"])
+    full = {"o": "out", "s": "q", "c": "l"}
+    assert (ex.format_extraction(graph, full, "o")
+            == "Tile.WGMMA(Tile.Elementwise(Tile.LDS), Tile.Elementwise(Tile.LDS))")
+    partial = {"o": "out", "s": "q"}
+    assert (ex.format_extraction(graph, partial, "o")
+            == "Tile.WGMMA(Tile.Elementwise(<c>), Tile.Elementwise(<c>))")
+
+
+def test_undominated_drops_only_dominated_nodes():
+    graph = ex.intern_graph(PRUNABLE)
+    live = ex._live_nodes(graph)
+
+    def kept(strict):
+        return {graph.nids[i] for i in ex._undominated(graph, live, strict=strict)}
+
+    assert kept(strict=False) == {"a", "b", "l1", "l2"}
+    # strict keeps a2: it ties a's cost, so only its optimality decides
+    assert kept(strict=True) == {"a", "a2", "b", "l1", "l2"}
+
+
+def test_backends_agree_on_optimum_and_optimal_set():
+    assert backends(), "no ILP backend installed"
+    real_new_model = ex._new_model
+    try:
+        for name, factory in backends():
+            ex._new_model = (lambda col_cost, rows, num_int, solver=None, factory=factory:
+                             factory(col_cost, rows, num_int))
+
+            # Only the x columns are integer; the y columns must still come
+            # back integral
+            graph = ex._ilp_graph(ex.intern_graph(PRUNABLE), None)
+            cost, values = ex._new_model(*ex._build_model(graph, None)).solve()
+            assert round(cost) == 4, name
+            assert all(abs(v - round(v)) <= 1e-6 for v in values), name
+
+            optimal_cost, solutions = ex.ilp_extract_all_optimal(PRUNABLE)
+            assert round(optimal_cost) == 4, name
+            assert sorted(solutions, key=lambda s: s["r"]) == TIED_OPTIMA, name
+    finally:
+        ex._new_model = real_new_model
+
+
+if __name__ == "__main__":
+    for name, fn in list(globals().items()):
+        if name.startswith("test_"):
+            fn()
+            print(f"ok  {name}")
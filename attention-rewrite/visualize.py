@@ -12,7 +12,41 @@ Generates two diagrams:
 import graphviz
 
 
-def _build_dot(graph_json, node_costs=None, selected=None, all_selected=None):
+def _tile_layout(graph_json):
+    """Tile-only structure shared by every diagram of one egraph.
+
+    Returns (eclass_to_nodes, labels, edges): Tile e-node ids grouped by
+    e-class, the label of each node, and (node, target, child_eclass) edges.
+    """
+    nodes = graph_json["nodes"]
+
+    tile_ops = {"Tile.input", "Tile.LDS", "Tile.LDR", "Tile.WGMMA",
+                "Tile.Elementwise", "Tile.STS", "Tile.STG"}
+    tile_nodes = {nid: n for nid, n in nodes.items() if n["op"] in tile_ops}
+
+    eclass_to_nodes = {}
+    labels = {}
+    for nid, n in tile_nodes.items():
+        eclass_to_nodes.setdefault(n["eclass"], []).append(nid)
+        op = n["op"]
+        if op == "Tile.input":
+            child_ops = [nodes[c]["op"] for c in n["children"]]
+            labels[nid] = f'{op}({", ".join(child_ops)})'
+        else:
+            labels[nid] = op
+
+    edges = []
+    for nid, n in tile_nodes.items():
+        for child_nid in n["children"]:
+            child_ec = nodes[child_nid]["eclass"]
+            if child_ec in eclass_to_nodes:
+                edges.append((nid, eclass_to_nodes[child_ec][0], child_ec))
+
+    return eclass_to_nodes, labels, edges
+
+
+def _build_dot(graph_json, node_costs=None, selected=None, all_selected=None,
+               layout=None):
     """Build a filtered graphviz Digraph showing only Tile operation nodes.
 
     If node_costs is provided (dict of node_id -> bytes), annotates each
@@ -24,17 +58,10 @@ def _build_dot(graph_json, node_costs=None, selected=None, all_selected=None):
       - Green:  node appears in ALL optimal solutions
       - Yellow: node appears in SOME but not all optimal solutions
       - Grey:   node not chosen in any optimal solution
+    layout: result of _tile_layout(graph_json), to share it between diagrams
     """
-    nodes = graph_json["nodes"]
     root_eclasses = set(graph_json["root_eclasses"])
-
-    tile_ops = {"Tile.input", "Tile.LDS", "Tile.LDR", "Tile.WGMMA",
-                "Tile.Elementwise", "Tile.STS", "Tile.STG"}
-    tile_nodes = {nid: n for nid, n in nodes.items() if n["op"] in tile_ops}
-
-    eclass_to_nodes = {}
-    for nid, n in tile_nodes.items():
-        eclass_to_nodes.setdefault(n["eclass"], []).append(nid)
+    eclass_to_nodes, labels, edges = layout or _tile_layout(graph_json)
 
     selected_nids = set(selected.values()) if selected else set()
 
@@ -105,14 +132,7 @@ def _build_dot(graph_json, node_costs=None, selected=None, all_selected=None):
             sub.attr(style="dashed,rounded,filled", fillcolor=color,
                      label=ec_label, fontsize="9", fontcolor="#666666")
             for nid in nids:
-                op = nodes[nid]["op"]
-                children = nodes[nid]["children"]
-                if op == "Tile.input":
-                    child_ops = [nodes[c]["op"] for c in children]
-                    label = f'{op}({", ".join(child_ops)})'
-                else:
-                    label = op
-
+                label = labels[nid]
                 count = node_selection_count.get(nid, 0)
                 if all_selected and n_solutions > 1:
                     if count == n_solutions:
@@ -158,12 +178,8 @@ def _build_dot(graph_json, node_costs=None, selected=None, all_selected=None):
                     f'</TABLE>>'
                 ))
 
-    for nid, n in tile_nodes.items():
-        for child_nid in n["children"]:
-            child_ec = nodes[child_nid]["eclass"]
-            if child_ec in eclass_to_nodes:
-                target = eclass_to_nodes[child_ec][0]
-                dot.edge(nid, target, lhead=f"cluster_{child_ec}")
+    for nid, target, child_ec in edges:
+        dot.edge(nid, target, lhead=f"cluster_{child_ec}")
 
     return dot
 
@@ -172,7 +188,7 @@ def visualize(graph_json, output_path="egraph", node_costs=None,
               selected=None, all_selected=None):
     """Save egraph visualizations as SVG.
 
-    graph_json: serialized egraph dict (from serialize_egraph or loaded from JSON)
+    graph_json: serialized egraph dict (from serialize_egraph_obj or loaded from JSON)
     output_path: base path for output files (without extension)
     node_costs: optional dict of {node_id: bytes_moved} for all selected nodes
     selected: optional dict of {eclass_id: node_id} — single optimal solution
@@ -180,7 +196,10 @@ def visualize(graph_json, output_path="egraph", node_costs=None,
                   When provided with more than one solution, nodes are colored
                   green (in all), yellow (in some), or grey (in none).
     """
-    dot = _build_dot(graph_json)
+    # Filtering, grouping and labels are the same for both diagrams
+    layout = _tile_layout(graph_json)
+
+    dot = _build_dot(graph_json, layout=layout)
     dot.render(output_path, format="svg", cleanup=True)
     print(f"Wrote {output_path}.svg")
 
@@ -188,7 +207,7 @@ def visualize(graph_json, output_path="egraph", node_costs=None,
         effective_selected = selected if not all_selected else None
         dot_costs = _build_dot(graph_json, node_costs=node_costs,
                                selected=effective_selected,
-                               all_selected=all_selected)
+                               all_selected=all_selected, layout=layout)
         cost_path = f"{output_path}-costs"
         dot_costs.render(cost_path, format="svg", cleanup=True)
         print(f"Wrote {cost_path}.svg")
@@ -9,14 +9,11 @@ from __future__ import annotations
 from egglog import *
 
 
-egraph = EGraph()
-
-
 # ── Sorts: computation graph ─────────────────────────────────────
 
 class Op(Expr):
     @classmethod
-    def input(cls, name: StringLike) -> Op: ...
+    def input(cls, input_id: i64Like) -> Op: ...
 
     @method(cost=10)  # single-kernel elementwise op
     def square(self) -> Op: ...
@@ -63,10 +60,7 @@ def wgmma_smem_smem(a: Op, b: Op) -> Op: ...
 # H100 lookup: 65536 32-bit regs per SM, 255 max per thread, 2048 max threads per SM
 
 @function(merge=lambda old, new: old.max(new))
-def total_regs(op: Op) -> i64: ...
-
-@function(merge=lambda old, new: old.min(new))
-def reg_legal(op: Op) -> i64: ...  # 1 = within budget, 0 = exceeds H100 register limit
+def total_regs(op: Op) -> i64: ...  # legality vs the 255-reg limit is checked at extraction
 
 
 # ── Sorts: memory hierarchy ──────────────────────────────────────
@@ -78,14 +72,26 @@ class MemRegion(Expr):
     def shared(cls) -> MemRegion: ...
     @classmethod
     def global_(cls) -> MemRegion: ...
+    # Merge result when two rules place one op in different regions
+    @classmethod
+    def conflict(cls) -> MemRegion: ...
 
 
-@function
+# Built once and reused by every rule below
+RF = MemRegion.register_file()
+SM = MemRegion.shared()
+GL = MemRegion.global_()
+
+
+@function(merge=lambda old, new: MemRegion.conflict())
 def mem_location(op: Op) -> MemRegion: ...
 
 @function
 def transfer_cost(src: MemRegion, dst: MemRegion) -> i64: ...
 
+@function(merge=lambda old, new: old.min(new))
+def in_regs(op: Op) -> i64: ...  # 1 = mem_location is the register file
+
 
 # ── Kernel metrics ───────────────────────────────────────────────
 
@@ -132,36 +138,47 @@ class Result(Expr):
 @function
 def result_of(op: Op) -> Result: ...
 
-@function(merge=lambda old, new: old.max(new))
-def composite_score(op: Op) -> i64: ...
-
 
 # ── Computation graph ────────────────────────────────────────────
 #    result = GEMM( X / sum(X^2),  Y )
 
-X = Op.input("X")
-Y = Op.input("Y")
+# Inputs are keyed by small integer ids rather than by name strings
+INPUTS: dict[str, int] = {}
+
+def input_op(name: str) -> Op:
+    """Op.input for `name`, interning it to the next free id on first use."""
+    return Op.input(i64(INPUTS.setdefault(name, len(INPUTS))))
+
+X = input_op("X")
+Y = input_op("Y")
 
-original = egraph.let("original",
-    gemm(X.divide(X.square().sum_reduce()), Y)
-)
+# Shared by original and the fused variants below
+denom = X.square().sum_reduce()
+
+original = gemm(X.divide(denom), Y)
 
 
 # ── Rewrite rules ───────────────────────────────────────────────
 
 a, b, c = vars_("a b c", Op)
 
-egraph.register(
+# Rules are collected here and built into one ruleset once all variables
+# exist; facts about this particular graph are kept apart and registered on
+# the egraph, so the ruleset can be run against other e-graphs too
+rules: list[RewriteOrRule] = []
+facts: list[Action] = []
+
+rules += [
     # Rearrangement:  GEMM(A/c, B) == GEMM(A,B)/c
     rewrite(gemm(a.divide(c), b)).to(gemm(a, b).divide(c)),
     # Fusion pattern: GEMM(A,B)/c  -> fused_gemm_div(A,B,c)
     rewrite(gemm(a, b).divide(c)).to(fused_gemm_div(a, b, c)),
-)
+]
 
 
 # ── Lower-level rewrite rules ─────────────────────────────────────
 
-egraph.register(
+rules += [
     # Store-load elimination: storing to SMEM then loading back is a no-op if already in regs
     rewrite(load_to_regs(store_to_smem(a))).to(a),
 
@@ -171,138 +188,118 @@ egraph.register(
 
     # Both wgmma variants produce the same mathematical result
     birewrite(wgmma_reg_smem(a, b)).to(wgmma_smem_smem(a, b)),
-)
+]
 
 
 # ── Lower-level memory placement rules ────────────────────────────
 
-egraph.register(
+rules += [
     # load_to_regs: output is in registers
     rule(
         load_to_regs(a),
     ).then(
-        union(mem_location(load_to_regs(a))).with_(MemRegion.register_file()),
+        set_(mem_location(load_to_regs(a))).to(RF),
     ),
 
     # store_to_smem: output is in shared memory
     rule(
         store_to_smem(a),
     ).then(
-        union(mem_location(store_to_smem(a))).with_(MemRegion.shared()),
+        set_(mem_location(store_to_smem(a))).to(SM),
     ),
 
     # tma_load: output lands in shared memory (H100 lookup: TMA writes to SMEM)
     rule(
         tma_load(a),
     ).then(
-        union(mem_location(tma_load(a))).with_(MemRegion.shared()),
-    ),
-
-    # wgmma output always accumulates in registers (H100 lookup: accumulator is in register file)
-    rule(wgmma_reg_smem(a, b)).then(
-        union(mem_location(wgmma_reg_smem(a, b))).with_(MemRegion.register_file()),
-    ),
-    rule(wgmma_smem_smem(a, b)).then(
-        union(mem_location(wgmma_smem_smem(a, b))).with_(MemRegion.register_file()),
-    ),
-)
-
-
-# ── Lower-level register budget rules ─────────────────────────────
-
-r = var("r", i64)
-
-egraph.register(
-    # wgmma_reg_smem: A in regs adds ~8 regs for the 16x16 descriptor (H100 lookup: wgmma register mapping)
-    rule(
-        wgmma_reg_smem(a, b),
-        eq(regs_per_thread(a)).to(r),
-    ).then(
-        set_(total_regs(wgmma_reg_smem(a, b))).to(r + i64(8)),
+        set_(mem_location(tma_load(a))).to(SM),
     ),
 
-    # wgmma_smem_smem: no extra regs for A, just accumulator (~4 regs baseline)
-    rule(
-        wgmma_smem_smem(a, b),
-    ).then(
-        set_(total_regs(wgmma_smem_smem(a, b))).to(i64(4)),
-    ),
+    # wgmma placement is set together with its metrics below
+]
 
-    # H100 hard limit: 255 regs per thread max (H100 lookup: SM90 register file constraint)
-    # Legal if within budget
-    rule(
-        eq(total_regs(a)).to(r),
-        r <= i64(255),
-    ).then(
-        set_(reg_legal(a)).to(i64(1)),
-    ),
-)
 
-# Metric rules for wgmma variants
-egraph.register(
+# Metric rules for wgmma variants, one rule per variant so each match sets
+# placement, register budget and metrics together
+rules += [
     rule(wgmma_reg_smem(a, b)).then(
+        # wgmma output always accumulates in registers (H100 lookup: accumulator is in register file)
+        set_(mem_location(wgmma_reg_smem(a, b))).to(RF),
+        # A in regs adds ~8 regs for the 16x16 descriptor (H100 lookup: wgmma register mapping)
+        set_(total_regs(wgmma_reg_smem(a, b))).to(i64(48)),         # 40 base + 8 descriptor
         set_(regs_per_thread(wgmma_reg_smem(a, b))).to(i64(40)),   # base + A occupies regs
         set_(occupancy_pct(wgmma_reg_smem(a, b))).to(i64(75)),      # reduced by register pressure
         set_(mem_bw_pct(wgmma_reg_smem(a, b))).to(i64(70)),         # B still streamed from SMEM
         set_(num_launches(wgmma_reg_smem(a, b))).to(i64(1)),
     ),
     rule(wgmma_smem_smem(a, b)).then(
+        set_(mem_location(wgmma_smem_smem(a, b))).to(RF),
+        set_(total_regs(wgmma_smem_smem(a, b))).to(i64(4)),         # no extra regs for A, just accumulator (~4 regs baseline)
         set_(regs_per_thread(wgmma_smem_smem(a, b))).to(i64(32)),  # fewer regs, both operands in SMEM
         set_(occupancy_pct(wgmma_smem_smem(a, b))).to(i64(100)),    # full occupancy, low register pressure
         set_(mem_bw_pct(wgmma_smem_smem(a, b))).to(i64(60)),        # both operands compete for SMEM bandwidth
         set_(num_launches(wgmma_smem_smem(a, b))).to(i64(1)),
     ),
-)
+]
 
 
 # ── Memory propagation rules ────────────────────────────────────
 
-egraph.register(
-    union(mem_location(X)).with_(MemRegion.global_()),
-    union(mem_location(Y)).with_(MemRegion.global_()),
+facts += [
+    set_(mem_location(X)).to(GL),
+    set_(mem_location(Y)).to(GL),
+
+    set_(transfer_cost(GL, SM)).to(i64(150)),  # ~150 cycles for global→SMEM load
+    set_(transfer_cost(SM, RF)).to(i64(20)),   # ~20 cycles for SMEM→register load
+    set_(transfer_cost(GL, RF)).to(i64(350)),  # ~350 cycles for uncached global→register
+    set_(transfer_cost(RF, RF)).to(i64(0)),    # free: already in registers
+]
 
-    set_(transfer_cost(MemRegion.global_(),       MemRegion.shared())).to(i64(150)),        # ~150 cycles for global→SMEM load
-    set_(transfer_cost(MemRegion.shared(),        MemRegion.register_file())).to(i64(20)),  # ~20 cycles for SMEM→register load
-    set_(transfer_cost(MemRegion.global_(),       MemRegion.register_file())).to(i64(350)), # ~350 cycles for uncached global→register
-    set_(transfer_cost(MemRegion.register_file(), MemRegion.register_file())).to(i64(0)),   # free: already in registers
+rules += [
+    # Register residency as a single-column fact the propagation rules join on
+    rule(eq(mem_location(a)).to(RF)).then(
+        set_(in_regs(a)).to(i64(1)),
+    ),
 
     # Guarded propagation (prevents infinite chains)
     rule(
         a.square(),
-        eq(mem_location(a)).to(MemRegion.register_file()),
+        eq(in_regs(a)).to(i64(1)),
     ).then(
-        union(mem_location(a.square())).with_(MemRegion.register_file()),
+        set_(mem_location(a.square())).to(RF),
     ),
     rule(
         a.sum_reduce(),
-        eq(mem_location(a)).to(MemRegion.register_file()),
+        eq(in_regs(a)).to(i64(1)),
     ).then(
-        union(mem_location(a.sum_reduce())).with_(MemRegion.register_file()),
+        set_(mem_location(a.sum_reduce())).to(RF),
     ),
     rule(
         a.divide(b),
-        eq(mem_location(a)).to(MemRegion.register_file()),
-        eq(mem_location(b)).to(MemRegion.register_file()),
+        eq(in_regs(a)).to(i64(1)),
+        eq(in_regs(b)).to(i64(1)),
     ).then(
-        union(mem_location(a.divide(b))).with_(MemRegion.register_file()),
+        set_(mem_location(a.divide(b))).to(RF),
     ),
 
     rule(gemm(a, b)).then(
-        union(mem_location(gemm(a, b))).with_(MemRegion.register_file()),
+        set_(mem_location(gemm(a, b))).to(RF),
     ),
     rule(fused_gemm_div(a, b, c)).then(
-        union(mem_location(fused_gemm_div(a, b, c))).with_(MemRegion.register_file()),
+        set_(mem_location(fused_gemm_div(a, b, c))).to(RF),
     ),
-)
+]
 
 
 # ── Fusion legality rules ───────────────────────────────────────
 
-egraph.register(
+facts += [
     # Assumed small enough for SMEM; in production would be computed from tensor dims vs GPU SMEM capacity
     set_(fits_in_smem(X)).to(i64(1)),
     set_(fits_in_smem(Y)).to(i64(1)),
+]
 
+rules += [
     rule(a.square(), eq(fits_in_smem(a)).to(i64(1))).then(
         set_(fits_in_smem(a.square())).to(i64(1)),
     ),
@@ -311,20 +308,20 @@ egraph.register(
     ),
 
     rule(
-        eq(mem_location(gemm(a, b))).to(MemRegion.register_file()),
-        eq(mem_location(a)).to(MemRegion.register_file()),
+        eq(mem_location(gemm(a, b))).to(RF),
+        eq(mem_location(a)).to(RF),
     ).then(
         set_(needs_reload(a)).to(i64(0)),  # 0 = no reload needed, data already in registers
     ),
-    rule(eq(mem_location(a)).to(MemRegion.global_())).then(
+    rule(eq(mem_location(a)).to(GL)).then(
         set_(needs_reload(a)).to(i64(1)),  # 1 = reload needed, data stuck in global memory
     ),
-)
+]
 
 
 # ── Kernel metric rules ─────────────────────────────────────────
 
-egraph.register(
+rules += [
     # Unfused: separate kernels for divide, square, sum_reduce, gemm
     rule(gemm(a.divide(c), b)).then(
         set_(num_launches(gemm(a.divide(c), b))).to(i64(4)),    # 4 kernel launches (square + sum + div + gemm)
@@ -339,7 +336,7 @@ egraph.register(
         set_(occupancy_pct(fused_gemm_div(a, b, c))).to(i64(50)),    # lower occupancy due to register pressure
         set_(mem_bw_pct(fused_gemm_div(a, b, c))).to(i64(85)),       # high bandwidth use, no intermediate mem trips
     ),
-)
+]
 
 
 # ── Warp specialization rules ───────────────────────────────────
@@ -347,7 +344,7 @@ egraph.register(
 ws_t = var("ws_t", Op)
 ws_w = var("ws_w", WarpSpec)
 
-egraph.register(
+warp_spec_rules = [
     rule(with_warp_spec(ws_t, ws_w)).then(
         union(result_of(with_warp_spec(ws_t, ws_w))).with_(result_of(ws_t))
     ),
@@ -358,7 +355,6 @@ egraph.register(
         set_(occupancy_pct(with_warp_spec(a, WarpSpec.homogeneous()))).to(i64(100)),     # full occupancy
         set_(mem_bw_pct(with_warp_spec(a, WarpSpec.homogeneous()))).to(i64(60)),         # moderate bandwidth
         set_(num_launches(with_warp_spec(a, WarpSpec.homogeneous()))).to(i64(1)),
-        set_(composite_score(with_warp_spec(a, WarpSpec.homogeneous()))).to(i64(180)),   # occupancy + mem_bw = 100+60+20 (base)
     ),
 
     # Producer-consumer: some warps load data, others compute — best bandwidth
@@ -367,7 +363,6 @@ egraph.register(
         set_(occupancy_pct(with_warp_spec(a, WarpSpec.producer_consumer()))).to(i64(75)),     # reduced by higher reg usage
         set_(mem_bw_pct(with_warp_spec(a, WarpSpec.producer_consumer()))).to(i64(95)),        # near-peak, overlaps loads + compute
         set_(num_launches(with_warp_spec(a, WarpSpec.producer_consumer()))).to(i64(1)),
-        set_(composite_score(with_warp_spec(a, WarpSpec.producer_consumer()))).to(i64(209)),  # highest score: bandwidth wins here
     ),
 
     # Pingpong: double-buffered, warps alternate between load and compute phases
@@ -376,20 +371,46 @@ egraph.register(
         set_(occupancy_pct(with_warp_spec(a, WarpSpec.pingpong()))).to(i64(80)),      # decent occupancy
         set_(mem_bw_pct(with_warp_spec(a, WarpSpec.pingpong()))).to(i64(80)),         # good bandwidth from overlapping
         set_(num_launches(with_warp_spec(a, WarpSpec.pingpong()))).to(i64(1)),
-        set_(composite_score(with_warp_spec(a, WarpSpec.pingpong()))).to(i64(192)),   # middle ground between homo and prod-con
     ),
-)
+]
 
 
 # ── Warp-specialized variants ───────────────────────────────────
 
-fused = fused_gemm_div(X, Y, X.square().sum_reduce())
+fused = fused_gemm_div(X, Y, denom)
+
+homo    = with_warp_spec(fused, WarpSpec.homogeneous())
+prodcon = with_warp_spec(fused, WarpSpec.producer_consumer())
+pp      = with_warp_spec(fused, WarpSpec.pingpong())
+
+
+# ── Install rules ───────────────────────────────────────────────
 
-homo    = egraph.let("homo",     with_warp_spec(fused, WarpSpec.homogeneous()))
-prodcon = egraph.let("prodcon",  with_warp_spec(fused, WarpSpec.producer_consumer()))
-pp      = egraph.let("pingpong", with_warp_spec(fused, WarpSpec.pingpong()))
+poc_rules = ruleset(*rules, name="poc_fusion")
+warp_spec_ruleset = ruleset(*warp_spec_rules, name="warp_spec")
 
 
 # ── Run equality saturation ─────────────────────────────────────
 
-egraph.run(10)  # 10 iterations is enough for this small graph to saturate
+def build_egraph(enable_warp_spec: bool = True) -> EGraph:
+    """Seed `original` and its facts, run saturation, return the egraph.
+
+    enable_warp_spec=False is for callers that only need `original`: it
+    skips the warp-specialized variants and the rules that fire on them.
+    """
+    egraph = EGraph()
+    egraph.register(original, *facts)
+
+    schedule = poc_rules
+    if enable_warp_spec:
+        egraph.register(homo, prodcon, pp)
+        schedule = poc_rules | warp_spec_ruleset
+
+    # Stop as soon as an iteration adds nothing new (saturated)
+    for _ in range(10):
+        if not egraph.run(1, ruleset=schedule).updated:
+            break
+    return egraph
+
+
+egraph = build_egraph()
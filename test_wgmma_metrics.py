@@ -0,0 +1,29 @@
+"""Check wgmma_metrics legality and config lookup on hand-picked configs.
+
+Run:  python test_wgmma_metrics.py   (or pytest)
+"""
+from __future__ import annotations
+import wgmma_metrics as wm
+
+
+def test_smem_overflow_has_no_legal_lowering():
+    # A and B tiles of 128 KB each: neither mode fits in SMEM
+    wide_k = wm.DType("WIDE_K", input_bytes=1, accum_bytes=4, K=1024, max_N=256)
+    m = wm.config_metrics(wide_k, 64)
+    assert not m["fits"]
+    assert m["cost_reg_smem"] == m["cost_smem_smem"] == wm.ILLEGAL_COST
+    assert wm.WgmmaConfig(wide_k, 64).winner == "NONE"
+
+
+def test_config_lookup_by_name_or_dtype_is_shared():
+    fp16 = wm.DTYPES_BY_NAME["FP16"]
+    assert wm.wgmma_config("FP16", 64) is wm.wgmma_config(fp16, 64)
+    assert wm.WgmmaConfig("FP16", 128) == wm.WgmmaConfig(fp16, 128)
+    assert wm.WgmmaConfig("FP16", 128).winner == "smem_smem"
+
+
+if __name__ == "__main__":
+    for name, fn in list(globals().items()):
+        if name.startswith("test_"):
+            fn()
+            print(f"ok  {name}")
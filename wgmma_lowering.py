@@ -14,6 +14,18 @@ from egglog import *
 egraph = EGraph()
 
 
+# ── Tile shape ──────────────────────────────────────────────────
+# Assumption: 1 warpgroup (128 threads) holds the accumulator.
+
+def accum_regs(M: int, N: int, accum_bytes: int, threads: int = 128) -> int:
+    """Accumulator registers per thread for an M×N tile.
+
+    regs = (M * N * accum_bytes) / (threads * 4 bytes/reg)
+      e.g. 64x64 FP32: 32 regs, 64x128 FP32: 64 regs, 64x256 FP32: 128 regs
+    """
+    return (M * N * accum_bytes) // (threads * 4)
+
+
 # ── Sorts ───────────────────────────────────────────────────────
 
 class Tile(Expr):
@@ -27,14 +39,14 @@ class MemRegion(Expr):
     def register_file(cls) -> MemRegion: ...
     @classmethod
     def shared(cls) -> MemRegion: ...
+    # Merge result when two rules place one op in different regions
+    @classmethod
+    def conflict(cls) -> MemRegion: ...
 
 
-class Mode(Expr):
-    """Wgmma variant tag — stays in its own e-class so metrics don't merge."""
-    @classmethod
-    def reg_smem(cls) -> Mode: ...
-    @classmethod
-    def smem_smem(cls) -> Mode: ...
+# Built once and reused by every rule below
+RF = MemRegion.register_file()
+SM = MemRegion.shared()
 
 
 # ── Operations ──────────────────────────────────────────────────
@@ -57,20 +69,13 @@ def wgmma_smem_smem(a: Tile, b: Tile) -> Tile: ...
 def gemm(a: Tile, b: Tile) -> Tile: ...
 
 
-# ── Analysis functions (on Mode, not Tile — so they don't merge) ──
+# ── Analysis functions ─────────────────────────────────────────
+# Per-variant metrics are constants, so they live in test_wgmma_lowering.py
+# rather than in the e-graph
 
-@function
+@function(merge=lambda old, new: MemRegion.conflict())
 def mem_loc(t: Tile) -> MemRegion: ...
 
-@function
-def regs_used(m: Mode) -> i64: ...
-
-@function
-def smem_reads(m: Mode) -> i64: ...
-
-@function
-def occupancy_pct(m: Mode) -> i64: ...
-
 
 # ── Inputs ──────────────────────────────────────────────────────
 # Both tiles start in shared memory (loaded by TMA before the wgmma loop)
@@ -85,62 +90,46 @@ result = egraph.let("result", gemm(A, B))
 
 a, b = vars_("a b", Tile)
 
-egraph.register(
+# The rules do not depend on A and B, so they form one ruleset that can be
+# run against other e-graphs; facts about these inputs are registered below
+wgmma_rules = ruleset(
     # Lowering: gemm can become either wgmma variant
     rewrite(gemm(a, b)).to(wgmma_reg_smem(load_to_regs(a), b)),  # load A to regs first
     rewrite(gemm(a, b)).to(wgmma_smem_smem(a, b)),                # use A directly from SMEM
 
     # Store-load elimination: round-trip through SMEM is a no-op
     rewrite(load_to_regs(store_to_smem(a))).to(a),
-)
-
 
-# ── Memory location propagation ────────────────────────────────
-
-egraph.register(
-    # Inputs live in SMEM
-    union(mem_loc(A)).with_(MemRegion.shared()),
-    union(mem_loc(B)).with_(MemRegion.shared()),
+    # ── Memory location propagation ──
 
     # load_to_regs moves data to register file
     rule(load_to_regs(a)).then(
-        union(mem_loc(load_to_regs(a))).with_(MemRegion.register_file()),
+        set_(mem_loc(load_to_regs(a))).to(RF),
     ),
     # store_to_smem moves data to shared memory
     rule(store_to_smem(a)).then(
-        union(mem_loc(store_to_smem(a))).with_(MemRegion.shared()),
+        set_(mem_loc(store_to_smem(a))).to(SM),
     ),
     # wgmma accumulator always lands in registers (H100: accumulator in RF)
     rule(wgmma_reg_smem(a, b)).then(
-        union(mem_loc(wgmma_reg_smem(a, b))).with_(MemRegion.register_file()),
+        set_(mem_loc(wgmma_reg_smem(a, b))).to(RF),
     ),
     rule(wgmma_smem_smem(a, b)).then(
-        union(mem_loc(wgmma_smem_smem(a, b))).with_(MemRegion.register_file()),
+        set_(mem_loc(wgmma_smem_smem(a, b))).to(RF),
     ),
+    name="wgmma_lowering",
 )
 
-
-# ── Metric rules (attached to Mode, not Tile) ────────────────
-# Assumption: 64x64 tile with FP32 accumulator, 1 warpgroup (128 threads).
-# Accumulator regs/thread = (M * N * sizeof(accum)) / (128 threads * 4 bytes/reg)
-#   e.g. 64x64 FP32: (64*64*4)/(128*4) = 32 regs
-#        64x128 FP32: (64*128*4)/(128*4) = 64 regs
-#        64x256 FP32: (64*256*4)/(128*4) = 128 regs
-# To generalize: parameterize M, N, accum_bytes and compute instead of hardcoding.
-
 egraph.register(
-    # wgmma(reg, smem): A in regs costs ~8 extra regs for the descriptor
-    set_(regs_used(Mode.reg_smem())).to(i64(40)),       # 32 accum (64x64 FP32) + 8 A descriptor
-    set_(smem_reads(Mode.reg_smem())).to(i64(1)),        # only B read from SMEM
-    set_(occupancy_pct(Mode.reg_smem())).to(i64(75)),    # reduced occupancy from higher reg usage
-
-    # wgmma(smem, smem): no regs for A, both operands compete for SMEM bandwidth
-    set_(regs_used(Mode.smem_smem())).to(i64(32)),      # 32 accum only (64x64 FP32)
-    set_(smem_reads(Mode.smem_smem())).to(i64(2)),       # both A and B read from SMEM
-    set_(occupancy_pct(Mode.smem_smem())).to(i64(100)),  # full occupancy, low reg pressure
+    # Inputs live in SMEM
+    set_(mem_loc(A)).to(SM),
+    set_(mem_loc(B)).to(SM),
 )
 
 
 # ── Run ─────────────────────────────────────────────────────────
 
-egraph.run(10)
+# Stop as soon as an iteration adds nothing new (saturated)
+for _ in range(10):
+    if not egraph.run(1, ruleset=wgmma_rules).updated:
+        break
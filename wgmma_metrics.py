@@ -11,6 +11,11 @@ tile configurations and data types on H100 (SM90), then runs egglog
 to pick the best wgmma mode for each configuration.
 """
 from __future__ import annotations
+import csv
+import functools
+from dataclasses import dataclass
+from pathlib import Path
+
 from egglog import *
 
 
@@ -21,6 +26,9 @@ REGS_PER_SM = 65536          # 32-bit registers per SM
 MAX_REGS_PER_THREAD = 255    # hard architectural cap
 MAX_THREADS_PER_SM = 2048    # max resident threads per SM
 SMEM_PER_SM_KB = 228         # max shared memory per SM (configurable up to 228 KB)
+SMEM_RESERVED_PER_BLOCK = 1024  # SMEM the runtime reserves for each resident block
+MAX_BLOCKS_PER_SM = 32       # max resident blocks per SM
+WARP_THREADS = 32            # register allocation unit
 WARPGROUP_THREADS = 128      # 4 warps × 32 threads = 1 warpgroup (unit for wgmma)
 SMEM_BW_BYTES_PER_CYCLE = 128  # SM90 shared memory: 128 bytes/cycle per SM partition
 
@@ -33,13 +41,30 @@ WGMMA_M = 64
 
 # ── Data type properties ──────────────────────────────────────
 
-DTYPES = {
-    "FP16":  {"input_bytes": 2, "accum_bytes": 4, "K": 16, "max_N": 256}, #accum always 4 bytes
-    "BF16":  {"input_bytes": 2, "accum_bytes": 4, "K": 16, "max_N": 256},
-    "TF32":  {"input_bytes": 4, "accum_bytes": 4, "K": 8,  "max_N": 256},
-    "FP8":   {"input_bytes": 1, "accum_bytes": 4, "K": 32, "max_N": 256},
-    "INT8":  {"input_bytes": 1, "accum_bytes": 4, "K": 32, "max_N": 256},
-}
+@dataclass(frozen=True, slots=True)
+class DType:
+    """wgmma operand properties of one input data type."""
+    name: str
+    input_bytes: int
+    accum_bytes: int  # accum always 4 bytes
+    K: int
+    max_N: int
+
+
+DTYPES = [
+    DType("FP16", input_bytes=2, accum_bytes=4, K=16, max_N=256),
+    DType("BF16", input_bytes=2, accum_bytes=4, K=16, max_N=256),
+    DType("TF32", input_bytes=4, accum_bytes=4, K=8,  max_N=256),
+    DType("FP8",  input_bytes=1, accum_bytes=4, K=32, max_N=256),
+    DType("INT8", input_bytes=1, accum_bytes=4, K=32, max_N=256),
+]
+
+DTYPES_BY_NAME = {dtype.name: dtype for dtype in DTYPES}
+
+
+def _resolve_dtype(dtype: str | DType) -> DType:
+    """The DType for a DTYPES name; DType instances pass through."""
+    return DTYPES_BY_NAME[dtype] if isinstance(dtype, str) else dtype
 
 
 # ── Analytical formulas ──────────────────────────────────────
@@ -49,6 +74,8 @@ def accum_regs(M: int, N: int, accum_bytes: int) -> int:
 
     Each warpgroup (128 threads) holds the full M×N output tile.
     Each element is accum_bytes wide; each register is 4 bytes (32-bit).
+    The accumulator stays in registers across the whole K loop, so it
+    does not grow with K or with the number of pipeline stages.
     regs = (M * N * accum_bytes) / (128 threads * 4 bytes/reg)
     """
     return (M * N * accum_bytes) // (WARPGROUP_THREADS * 4)
@@ -58,11 +85,13 @@ def a_descriptor_regs(M: int, K: int, input_bytes: int) -> int:
     """Extra registers for A operand in reg_smem mode.
 
     In reg_smem mode, operand A (M×K) must be loaded into registers.
-    Each thread in the warpgroup holds a portion:
-    regs = (M * K * input_bytes) / (128 threads * 4 bytes/reg)
+    wgmma takes A packed into 32-bit lanes: 4 FP8/INT8, 2 FP16/BF16 or
+    1 TF32 element per register. Each thread in the warpgroup holds a portion:
+    regs = ceil((M * K) / (128 threads * elements_per_reg))
     Minimum 8 regs (hardware descriptor overhead).
     """
-    data_regs = (M * K * input_bytes) // (WARPGROUP_THREADS * 4)
+    elements_per_reg = 4 // input_bytes
+    data_regs = -(-(M * K) // (WARPGROUP_THREADS * elements_per_reg))  # ceil
     return max(data_regs, 8)  # at least 8 for the matrix descriptor
 
 
@@ -78,137 +107,382 @@ def total_regs_per_thread(accum: int, a_desc: int, overhead: int = OVERHEAD_REGS
     Source: CUDA Programming Guide, "Register Allocation Granularity".
     """
     raw = accum + a_desc + overhead
-    return ((raw + 7) // 8) * 8  # round up to next multiple of 8
+    return (raw + 7) & ~7  # round up to next multiple of 8 (raw >= 0)
 
 
 def occupancy_by_regs(regs_per_thread: int, block_threads: int = 128) -> float:
     """Occupancy limited by register usage.
 
-    regs_per_block = regs_per_thread × block_threads
-    Registers per block are allocated in chunks of 256.
-    max_blocks = REGS_PER_SM / regs_per_block (rounded)
+    SM90 allocates registers per warp, in chunks of 256:
+    regs_per_warp = regs_per_thread × 32 (rounded up to 256)
+    A block only becomes resident once all of its warps fit:
+    max_blocks = (REGS_PER_SM / regs_per_warp) / warps_per_block
     occupancy = (max_blocks × block_threads) / MAX_THREADS_PER_SM
     """
-    regs_per_block = regs_per_thread * block_threads
-    # SM90: register allocation granularity is 256 registers per block
-    regs_per_block = ((regs_per_block + 255) // 256) * 256
-    max_blocks_by_regs = REGS_PER_SM // regs_per_block
+    regs_per_warp = regs_per_thread * WARP_THREADS
+    regs_per_warp = (regs_per_warp + 255) & ~255  # round up (regs_per_warp >= 0)
+    max_warps_by_regs = REGS_PER_SM // regs_per_warp
+    warps_per_block = (block_threads + WARP_THREADS - 1) // WARP_THREADS
+    max_blocks_by_regs = max_warps_by_regs // warps_per_block
     active_threads = max_blocks_by_regs * block_threads
     return min(active_threads / MAX_THREADS_PER_SM, 1.0)
 
 
-def smem_per_tile(M: int, N: int, K: int, input_bytes: int) -> int:
-    """Shared memory bytes for one A tile + one B tile.
+def smem_per_tile(M: int, N: int, K: int, input_bytes: int, stages: int = 2) -> int:
+    """Shared memory bytes for one A tile + one B tile per pipeline stage.
 
     A tile: M × K × input_bytes
     B tile: K × N × input_bytes
-    Double-buffered: ×2 (one being loaded while the other is consumed).
+    Pipelined: ×stages (TMA loads later K blocks while one is consumed).
+    stages=2 is plain double buffering.
     """
     a_bytes = M * K * input_bytes
     b_bytes = K * N * input_bytes
-    return (a_bytes + b_bytes) * 2  # double buffered. next one loaded with TMA
+    return (a_bytes + b_bytes) * stages
+
+
+def arithmetic_intensity(M: int, N: int, K: int, input_bytes: int) -> float:
+    """FLOPs per byte of A and B operand read from SMEM.
+
+    The accumulator stays FP32 in registers, so narrower inputs only
+    shrink the bytes: FP8 has twice the intensity of FP16 at the same M, N, K.
+    AI = 2 * M * N * K / ((M * K + K * N) * input_bytes)
+    """
+    return 2 * M * N * K / ((M * K + K * N) * input_bytes)
+
+
+def blocks_by_smem(smem_bytes: int) -> int:
+    """Resident blocks that fit in SMEM, counting each block's reserved 1 KB."""
+    return (SMEM_PER_SM_KB * 1024) // (smem_bytes + SMEM_RESERVED_PER_BLOCK)
 
 
 def smem_fits(smem_bytes: int) -> bool:
     """Does the tile fit in SM90's configurable shared memory?"""
-    return smem_bytes <= SMEM_PER_SM_KB * 1024
+    return blocks_by_smem(smem_bytes) >= 1
+
+
+def occupancy_by_smem(smem_bytes: int, block_threads: int = 128) -> float:
+    """Occupancy limited by shared memory usage."""
+    active_threads = blocks_by_smem(smem_bytes) * block_threads
+    return min(active_threads / MAX_THREADS_PER_SM, 1.0)
+
+
+def occupancy(regs_per_thread: int, smem_bytes: int, block_threads: int = 128) -> float:
+    """Occupancy under registers, SMEM and the resident-block cap jointly.
+
+    Whichever resource runs out first binds, as in the CUDA occupancy
+    calculator.
+    """
+    occ_blocks = MAX_BLOCKS_PER_SM * block_threads / MAX_THREADS_PER_SM
+    return min(occupancy_by_regs(regs_per_thread, block_threads),
+               occupancy_by_smem(smem_bytes, block_threads),
+               occ_blocks, 1.0)
+
+
+def spill_smem_bytes(regs_over: int, threads: int = WARPGROUP_THREADS) -> int:
+    """Shared memory bytes for registers spilled past the per-thread cap.
+
+    CUDA 13 can spill to SMEM instead of local memory; each spilled
+    32-bit register takes 4 bytes per thread.
+    """
+    return max(0, regs_over) * 4 * threads
+
+
+# ── Cost model ───────────────────────────────────────────────
+# cost = ALPHA * regs + BETA * smem_cycles + occupancy_penalty
+# Register cost alone makes smem_smem win everywhere. Weighting SMEM
+# traffic lets reg_smem win for large N, where occupancy is equal and
+# keeping A in registers halves the operand reads (Triton's WGMMA RS path).
+
+COST_ALPHA = 1   # per register per thread
+COST_BETA = 4    # per cycle of SMEM operand traffic
+ILLEGAL_COST = 1_000_000  # candidate is not legal for this config
+
+
+def smem_cycles(M: int, N: int, K: int, input_bytes: int, a_in_regs: bool) -> int:
+    """Cycles to read the wgmma operands from SMEM.
+
+    smem_smem reads A (M×K) and B (K×N); reg_smem reads only B.
+    """
+    a_bytes = 0 if a_in_regs else M * K * input_bytes
+    b_bytes = K * N * input_bytes
+    return (a_bytes + b_bytes) // SMEM_BW_BYTES_PER_CYCLE
+
+
+def occupancy_penalty(occupancy: float) -> int:
+    """Penalty for idle warp slots: 0 at full occupancy, 1000 at none."""
+    return int((1.0 - occupancy) * 1000)
+
+
+def weighted_cost(regs: int, cycles: int, occupancy: float) -> int:
+    """Combined extraction cost of one wgmma lowering."""
+    return COST_ALPHA * regs + COST_BETA * cycles + occupancy_penalty(occupancy)
+
+
+# ── egglog model ──────────────────────────────────────────────
+# Declared and saturated once. The rewrites do not depend on the config,
+# so one e-graph holds every lowering of gemm(A, B), and each config only
+# changes the costs the extractor sees.
+
+class Tile(Expr):
+    @classmethod
+    def smem(cls, name: StringLike) -> Tile: ...
+
+
+@function
+def wgmma_reg_smem(a: Tile, b: Tile) -> Tile: ...
+
+@function
+def wgmma_reg_smem_spilled(a: Tile, b: Tile) -> Tile: ...
+
+@function
+def wgmma_smem_smem(a: Tile, b: Tile) -> Tile: ...
+
+@function
+def gemm(a: Tile, b: Tile) -> Tile: ...
+
+@function
+def load_to_regs(t: Tile) -> Tile: ...
+
+
+egraph = EGraph()
+
+a, b = vars_("a b", Tile)
+
+A = Tile.smem("A")
+B = Tile.smem("B")
+result = egraph.let("result", gemm(A, B))
+
+metric_rules = ruleset(
+    rewrite(gemm(a, b)).to(wgmma_reg_smem(load_to_regs(a), b)),
+    rewrite(gemm(a, b)).to(wgmma_reg_smem_spilled(load_to_regs(a), b)),
+    rewrite(gemm(a, b)).to(wgmma_smem_smem(a, b)),
+)
+
+# Stop as soon as an iteration adds nothing new (saturated)
+for _ in range(10):
+    if not egraph.run(1, ruleset=metric_rules).updated:
+        break
+
+
+MODE_NAMES = {
+    wgmma_reg_smem: "reg_smem",
+    wgmma_reg_smem_spilled: "reg_smem_spill",
+    wgmma_smem_smem: "smem_smem",
+}
+
+
+def config_cost_model(cost_reg_smem: int, cost_spilled: int, cost_smem_smem: int,
+                      load_cost: int) -> CostModel:
+    """Extraction cost model for one config's weighted costs.
+
+    load_cost is the ldmatrix traffic of moving A into registers, charged
+    on load_to_regs so both reg_smem forms pay it on top of their own cost.
+    """
+    node_costs = {
+        wgmma_reg_smem: cost_reg_smem,
+        wgmma_reg_smem_spilled: cost_spilled,
+        wgmma_smem_smem: cost_smem_smem,
+        # high cost so extractor prefers a lowered form
+        gemm: cost_reg_smem + cost_spilled + cost_smem_smem + load_cost,
+        load_to_regs: load_cost,
+    }
+
+    def cost_model(egraph: EGraph, expr: BaseExpr, children_costs: list[int]) -> int:
+        return sum(children_costs, start=node_costs.get(get_callable_fn(expr), 1))
+
+    return cost_model
+
+
+@functools.lru_cache(maxsize=None)
+def extract_winner(cost_reg_smem: int, cost_spilled: int, cost_smem_smem: int,
+                   load_cost: int) -> str:
+    """Name in MODE_NAMES of the lowering egglog extracts for these costs.
+
+    "NONE" if even the cheapest lowering has an ILLEGAL_COST node.
+
+    Cached by cost tuple, so configs with the same costs (e.g. FP16 and
+    BF16) share one extraction.
+    """
+    cost_model = config_cost_model(cost_reg_smem, cost_spilled, cost_smem_smem, load_cost)
+    best, cost = egraph.extract(result, include_cost=True, cost_model=cost_model)
+    if cost >= ILLEGAL_COST:
+        return "NONE"  # every lowering is illegal for this config
+    return MODE_NAMES[get_callable_fn(best)]
 
 
 # ── Sweep configurations ─────────────────────────────────────
 
 TILE_NS = [64, 128, 256]
+STAGES = [2, 3, 4, 5]  # K-loop pipeline depths (CUTLASS's Stages parameter)
+
+
+def max_stages(M: int, N: int, K: int, input_bytes: int, stages: list[int] = STAGES) -> int:
+    """Deepest pipeline in stages whose tiles still fit in SMEM.
+
+    Falls back to the shallowest one if none fits, so the config is
+    still reported (and marked as not fitting).
+    """
+    fitting = [s for s in stages if smem_fits(smem_per_tile(M, N, K, input_bytes, s))]
+    return max(fitting, default=min(stages))
+
+
+def config_metrics(dtype: DType, N: int, M: int = WGMMA_M, stages: int | None = None) -> dict:
+    """Analytical metrics and extraction costs of one (dtype, N) config.
+
+    stages defaults to the deepest pipeline in STAGES that fits in SMEM.
+
+    Pure arithmetic with no egglog calls, so an outer autotuner loop can
+    score configs and only extract the ones it keeps.
+    """
+    K = dtype.K
+    input_bytes = dtype.input_bytes
+
+    # ── Register analysis ──
+    acc = accum_regs(M, N, dtype.accum_bytes)
+    a_desc = a_descriptor_regs(M, K, input_bytes)
+    regs_smem_smem = total_regs_per_thread(acc, 0)           # no A in regs
+    regs_reg_smem  = total_regs_per_thread(acc, a_desc)      # A loaded to regs
+
+    # ── Shared memory analysis ──
+    if stages is None:
+        stages = max_stages(M, N, K, input_bytes)
+    smem_bytes = smem_per_tile(M, N, K, input_bytes, stages)
+    fits = smem_fits(smem_bytes)
+
+    # ── Occupancy analysis ──
+    occ_smem_smem = occupancy(regs_smem_smem, smem_bytes)
+    occ_reg_smem  = occupancy(regs_reg_smem, smem_bytes)
+
+    # ── Arithmetic intensity ──
+    ai = arithmetic_intensity(M, N, K, input_bytes)
+
+    # ── Weighted cost ──
+    cycles_rs = smem_cycles(M, N, K, input_bytes, a_in_regs=True)
+    cost_rs = weighted_cost(regs_reg_smem, cycles_rs, occ_reg_smem)
+    cost_ss = weighted_cost(regs_smem_smem,
+                            smem_cycles(M, N, K, input_bytes, a_in_regs=False),
+                            occ_smem_smem)
+    if not fits:
+        # Both modes stage B (and the A tile it is loaded from) in SMEM
+        cost_rs = cost_ss = ILLEGAL_COST
+    if regs_smem_smem > MAX_REGS_PER_THREAD:
+        cost_ss = ILLEGAL_COST  # accumulators overflow the register cap
+
+    # ── Register spill to SMEM ──
+    # Past the register cap, reg_smem is only legal if the excess
+    # spills to SMEM, and only if the spill still fits there.
+    spill_bytes = spill_smem_bytes(regs_reg_smem - MAX_REGS_PER_THREAD)
+    cost_spilled = ILLEGAL_COST
+    if spill_bytes > 0:
+        cost_rs = ILLEGAL_COST
+        if smem_fits(smem_bytes + spill_bytes):
+            cost_spilled = weighted_cost(
+                MAX_REGS_PER_THREAD,
+                cycles_rs + spill_bytes // SMEM_BW_BYTES_PER_CYCLE,
+                occupancy(MAX_REGS_PER_THREAD, smem_bytes + spill_bytes))
+
+    return {
+        "config": f"{dtype.name} {M}x{N}x{K}",
+        "dtype": dtype.name, "M": M, "N": N, "K": K, "stages": stages,
+        "acc": acc, "a_desc": a_desc,
+        "regs_reg_smem": regs_reg_smem, "regs_smem_smem": regs_smem_smem,
+        "smem_bytes": smem_bytes,
+        "occ_reg_smem": occ_reg_smem, "occ_smem_smem": occ_smem_smem,
+        "legal_reg_smem": regs_reg_smem <= MAX_REGS_PER_THREAD,
+        "legal_smem_smem": regs_smem_smem <= MAX_REGS_PER_THREAD,
+        "fits": fits,
+        "ai": ai,
+        "cost_reg_smem": cost_rs, "cost_spilled": cost_spilled,
+        "cost_smem_smem": cost_ss,
+        "load_cost": COST_BETA * a_desc,  # ldmatrix of A, approximated by its regs
+    }
+
+
+@dataclass(frozen=True)
+class WgmmaConfig:
+    """One (dtype, N) config; metrics and winner are computed on first access.
+
+    dtype may be given as a DTYPES name; it is stored as the DType.
+    """
+    dtype: DType
+    N: int
+
+    def __post_init__(self):
+        object.__setattr__(self, "dtype", _resolve_dtype(self.dtype))
+
+    @functools.cached_property
+    def metrics(self) -> dict:
+        return config_metrics(self.dtype, self.N)
+
+    @functools.cached_property
+    def winner(self) -> str:
+        m = self.metrics
+        # Extract from the shared e-graph with this config's costs
+        return extract_winner(m["cost_reg_smem"], m["cost_spilled"],
+                              m["cost_smem_smem"], m["load_cost"])
+
+    @functools.cached_property
+    def row(self) -> dict:
+        return {**self.metrics, "winner": self.winner}
+
+
+def wgmma_config(dtype: str | DType, N: int) -> WgmmaConfig:
+    """The shared WgmmaConfig for (dtype, N); dtype may be a DTYPES name."""
+    return _wgmma_config(_resolve_dtype(dtype), N)
+
+
+@functools.lru_cache(maxsize=None)
+def _wgmma_config(dtype: DType, N: int) -> WgmmaConfig:
+    return WgmmaConfig(dtype, N)
+
+
+def sweep(dtypes: list[DType] = DTYPES, tile_ns: list[int] = TILE_NS) -> list[dict]:
+    """config_metrics and egglog winner for every (dtype, N) config, as table rows."""
+    return [wgmma_config(dtype, N).row for dtype in dtypes for N in tile_ns]
+
+
+def write_sweep_csv(rows: list[dict], path: str | Path) -> None:
+    """Persist sweep rows as CSV, one column per row key."""
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+SWEEP_CSV = Path(__file__).parent / "results" / "wgmma_metrics_sweep.csv"
+
+ROW_FORMAT = ("{config:<22} {stages:>3} {acc:>4} {a_desc:>6} "
+              "{regs_reg_smem:>3}/{regs_smem_smem:<3} "
+              "{smem_bytes:>7}B "
+              "{occ_reg_smem:>7.0%} {occ_smem_smem:>8.0%} "
+              "{fit:>8} {ai:>6.0f} {winner:>12}")
+
+
+def dump_sweep() -> None:
+    """Print the sweep table and write it to SWEEP_CSV."""
+    rows = sweep()
+    write_sweep_csv(rows, SWEEP_CSV)
+
+    lines = [
+        f"{'Config':<22} {'Stg':>3} {'Acc':>4} {'A_desc':>6} {'Tot_reg':>7} {'Tot_smem':>8} "
+        f"{'Occ_reg%':>8} {'Occ_smem%':>9} {'SMEM_fit':>8} {'AI':>6} {'Winner':>12}",
+        "-" * 111,
+    ]
+    lines += [ROW_FORMAT.format(**row, fit="yes" if row["fits"] else "NO") for row in rows]
+    lines += [
+        "",
+        "NONE = every lowering exceeds 255 regs/thread or SMEM (illegal on SM90)",
+        "reg_smem_spill = reg_smem with registers past 255 spilled to SMEM",
+        "Tot_reg shows reg_smem/smem_smem",
+        "Stg = deepest K-loop pipeline (stages) whose tiles fit in SMEM",
+        "AI = FLOPs per SMEM operand byte",
+        f"Full sweep written to results/{SWEEP_CSV.name}",
+        "Costs include 16 overhead regs (pipeline + addressing), rounded to multiple of 8",
+        f"Winner cost = {COST_ALPHA}*regs + {COST_BETA}*SMEM cycles + occupancy penalty",
+    ]
+    print("\n".join(lines))
+
 
-print(f"{'Config':<22} {'Acc':>4} {'A_desc':>6} {'Tot_reg':>7} {'Tot_smem':>8} "
-      f"{'Occ_reg%':>8} {'Occ_smem%':>9} {'SMEM_fit':>8} {'Winner':>12}")
-print("-" * 100)
-
-for dtype_name, props in DTYPES.items():
-    for N in TILE_NS:
-        K = props["K"]
-        M = WGMMA_M
-
-        # ── Register analysis ──
-        acc = accum_regs(M, N, props["accum_bytes"])
-        a_desc = a_descriptor_regs(M, K, props["input_bytes"])
-
-        regs_smem_smem = total_regs_per_thread(acc, 0)           # no A in regs
-        regs_reg_smem  = total_regs_per_thread(acc, a_desc)      # A loaded to regs
-
-        # ── Occupancy analysis ──
-        occ_smem_smem = occupancy_by_regs(regs_smem_smem)
-        occ_reg_smem  = occupancy_by_regs(regs_reg_smem)
-
-        # ── Shared memory analysis ──
-        smem_bytes = smem_per_tile(M, N, K, props["input_bytes"])
-        fits = smem_fits(smem_bytes)
-
-        # ── Check register legality ──
-        legal_ss = regs_smem_smem <= MAX_REGS_PER_THREAD
-        legal_rs = regs_reg_smem <= MAX_REGS_PER_THREAD
-
-        # For each config, build a fresh e-graph with computed costs.
-        egraph = EGraph()
-
-        class Tile(Expr):
-            @classmethod
-            def smem(cls, name: StringLike) -> Tile: ...
-
-        class Mode(Expr):
-            @classmethod
-            def reg_smem(cls) -> Mode: ...
-            @classmethod
-            def smem_smem(cls) -> Mode: ...
-
-        # ── Cost model: register pressure (current) ──
-        # Fewer regs = cheaper. Minimizing regs maximizes occupancy.
-        # smem_smem always wins here because it avoids loading A into registers.
-        @function(cost=regs_reg_smem)
-        def wgmma_reg_smem(a: Tile, b: Tile) -> Tile: ...
-
-        @function(cost=regs_smem_smem)
-        def wgmma_smem_smem(a: Tile, b: Tile) -> Tile: ...
-
-        @function(cost=regs_smem_smem + regs_reg_smem)  # high cost so extractor prefers a lowered form
-        def gemm(a: Tile, b: Tile) -> Tile: ...
-
-        @function(cost=a_desc)  # cost of loading A to regs
-        def load_to_regs(t: Tile) -> Tile: ...
-
-        # ── Alternative: use SMEM bandwidth as cost instead of regs ──
-        # a_bytes = M * K * input_bytes;  b_bytes = K * N * input_bytes
-        # cost_ss = (a_bytes + b_bytes) // 128   # reads both A,B from SMEM
-        # cost_rs = b_bytes // 128 + 20          # reads only B (+ldmatrix)
-        # reg_smem wins for large N where halving SMEM traffic matters.
-
-        a, b = vars_("a b", Tile)
-
-        A = Tile.smem("A")
-        B = Tile.smem("B")
-        result = egraph.let("result", gemm(A, B))
-
-        egraph.register(
-            rewrite(gemm(a, b)).to(wgmma_reg_smem(load_to_regs(a), b)),
-            rewrite(gemm(a, b)).to(wgmma_smem_smem(a, b)),
-        )
-        egraph.run(10)
-
-        best = egraph.extract(result)
-        winner = "reg_smem" if "reg_smem" in str(best) else "smem_smem"
-
-        # Mark illegal configs
-        if not legal_rs:
-            winner += "*" if winner == "reg_smem" else ""
-        if not legal_ss:
-            winner += "*" if winner == "smem_smem" else ""
-
-        config = f"{dtype_name} {M}x{N}x{K}"
-        print(f"{config:<22} {acc:>4} {a_desc:>6} "
-              f"{regs_reg_smem:>3}/{regs_smem_smem:<3} "
-              f"{smem_bytes:>7}B "
-              f"{occ_reg_smem:>7.0%} {occ_smem_smem:>8.0%} "
-              f"{'yes' if fits else 'NO':>8} {winner:>12}")
-
-print()
-print("* = exceeds 255 regs/thread (illegal on SM90)")
-print("Tot_reg shows reg_smem/smem_smem")
-print("Costs include 16 overhead regs (pipeline + addressing), rounded to multiple of 8")
+if __name__ == "__main__":
+    dump_sweep()